@@ -0,0 +1,356 @@
+# ----------------------------------------------------------------------------#
+# JSON API.
+# ----------------------------------------------------------------------------#
+# Versioned read API under /api/v1 built on Flask-RESTful:
+#
+#   /venues, /artists, /shows      cursor-paginated lists
+#   /venues/<id>, /artists/<id>    details
+#   /venues/search, /artists/search?q=
+#   /venues/facets, /artists/facets
+#   /venues/available?from=&to=    venues with nothing booked then
+#   /venues/nearby?lat=&lng=&km=   venues within km, nearest first
+#   /venues/<id>/matches           artists seeking a venue, best match first
+#   /artists/<id>/matches          venues seeking talent, best match first
+#
+# The venue and artist lists take the filters ?genre=&state=&city=&seeking=
+# (see facets.py), and the facets count the rows they match per genre,
+# state, city and seeking flag. ?fields=a,b selects only those columns.
+# Show counts come from the venue and artist counter columns. Lists are
+# ordered by a unique key and continue from ?after=<cursor>, so deep pages
+# cost the same as the first. Large responses are gzipped for clients that
+# accept it.
+import base64
+import gzip
+from datetime import datetime
+
+from flask import Blueprint, current_app, request
+from flask_restful import Api, Resource, abort
+from sqlalchemy import func, tuple_
+
+import bookings
+import facets
+import geo
+import matching
+from cache import cached
+from models import db, Show, Venue, Artist
+from queries import encode_cursor, decode_cursor
+from search import search
+
+blueprint = Blueprint('api', __name__, url_prefix='/api/v1')
+api = Api(blueprint)
+
+# Responses smaller than this are not worth compressing.
+GZIP_MIN_SIZE = 500
+
+COUNT_FIELDS = ('num_upcoming_shows', 'num_past_shows')
+
+ENTITY_FIELDS = {
+    Venue: ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+            'facebook_link', 'website', 'seeking_talent', 'seeking_description',
+            'latitude', 'longitude') + COUNT_FIELDS,
+    Artist: ('id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+             'facebook_link', 'website', 'seeking_venue', 'seeking_description') + COUNT_FIELDS,
+}
+
+LIST_FIELDS = ('id', 'name', 'city', 'state', 'num_upcoming_shows')
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'end_time': Show.end_time,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+}
+
+
+#  Helpers
+#  ----------------------------------------------------------------
+
+def _fields(allowed, default):
+    if not request.args.get('fields'):
+        return list(default)
+    fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        abort(400, message='Unknown fields: {}. Available: {}.'.format(
+            ', '.join(unknown), ', '.join(allowed)))
+    return fields
+
+
+def _limit():
+    default = current_app.config.get('API_PAGE_SIZE', 50)
+    return max(1, min(request.args.get('limit', default, type=int),
+                      current_app.config.get('API_MAX_PAGE_SIZE', 200)))
+
+
+def _after(decode):
+    if not request.args.get('after'):
+        return None
+    try:
+        return decode(request.args['after'])
+    except ValueError:
+        abort(400, message='Invalid cursor.')
+
+
+def _filters(entity):
+    try:
+        return facets.conditions(entity, request.args)
+    except ValueError as e:
+        abort(400, message=str(e))
+
+
+def _encode_id(id):
+    return base64.urlsafe_b64encode(str(id).encode()).decode()
+
+
+def _decode_id(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, UnicodeError, base64.binascii.Error) as e:
+        raise ValueError('invalid cursor: {}'.format(e))
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _serialize(row, fields):
+    return {field: _jsonable(getattr(row, field)) for field in fields}
+
+
+def _page(rows, fields, limit, cursor):
+    # rows holds up to limit + 1 rows; the extra one only signals that
+    # another page exists.
+    rows = list(rows)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {'data': [_serialize(row, fields) for row in rows],
+            'next': cursor(rows[-1]) if more else None}
+
+
+def _column(entity, field):
+    if field == 'num_past_shows':
+        return entity.num_shows - entity.num_upcoming_shows
+    return getattr(entity, field)
+
+
+def entity_query(entity, fields):
+    # Selects the requested columns of the entity. The id is always selected
+    # (under its own label) for paging.
+    columns = [_column(entity, field).label(field) for field in fields]
+    columns.append(entity.id.label('_id'))
+    return db.session.query(*columns).select_from(entity)
+
+
+#  Resources
+#  ----------------------------------------------------------------
+
+class EntityList(Resource):
+    entity = None
+
+    def get(self):
+        fields = _fields(ENTITY_FIELDS[self.entity], LIST_FIELDS)
+        limit = _limit()
+        query = entity_query(self.entity, fields).filter(*_filters(self.entity))
+        after = _after(_decode_id)
+        if after is not None:
+            query = query.filter(self.entity.id > after)
+        rows = query.order_by(self.entity.id).limit(limit + 1)
+        return _page(rows, fields, limit, lambda row: _encode_id(row._id))
+
+
+class EntityDetail(Resource):
+    entity = None
+
+    def get(self, id):
+        fields = _fields(ENTITY_FIELDS[self.entity], ENTITY_FIELDS[self.entity])
+        row = entity_query(self.entity, fields).filter(self.entity.id == id).first()
+        if row is None:
+            abort(404, message='{} {} does not exist.'.format(self.entity.__name__, id))
+        return _serialize(row, fields)
+
+
+class EntitySearch(Resource):
+    entity = None
+
+    def get(self):
+        term = request.args.get('q', '')
+        return {'data': search(self.entity, term, limit=_limit())}
+
+
+class EntityFacets(Resource):
+    entity = None
+
+    def get(self):
+        return facets.facet_counts(self.entity, _filters(self.entity))
+
+
+class VenueList(EntityList):
+    entity = Venue
+
+
+class VenueDetail(EntityDetail):
+    entity = Venue
+
+
+class VenueSearch(EntitySearch):
+    entity = Venue
+
+
+class VenueFacets(EntityFacets):
+    entity = Venue
+    method_decorators = [cached(['venues'])]
+
+
+class VenueAvailability(Resource):
+
+    def get(self):
+        # Venues with no show overlapping ?from= to ?to= (ISO date and time),
+        # optionally only in ?city= and ?state=. Paged like /venues.
+        fields = _fields(ENTITY_FIELDS[Venue], LIST_FIELDS)
+        limit = _limit()
+        try:
+            start, end = (datetime.fromisoformat(request.args[arg]) for arg in ('from', 'to'))
+        except (KeyError, ValueError):
+            abort(400, message='from and to must be given as YYYY-MM-DDTHH:MM.')
+        if end <= start:
+            abort(400, message='to must be after from.')
+
+        query = entity_query(Venue, fields).filter(bookings.free(start, end))
+        for arg, column in (('city', Venue.city), ('state', Venue.state)):
+            if request.args.get(arg):
+                query = query.filter(func.lower(column) == request.args[arg].lower())
+        after = _after(_decode_id)
+        if after is not None:
+            query = query.filter(Venue.id > after)
+        rows = query.order_by(Venue.id).limit(limit + 1)
+        return _page(rows, fields, limit, lambda row: _encode_id(row._id))
+
+
+class VenueNearby(Resource):
+
+    def get(self):
+        # Located venues within ?km= (default 10) of ?lat= and ?lng=, with
+        # their distance, nearest first.
+        latitude = request.args.get('lat', type=float)
+        longitude = request.args.get('lng', type=float)
+        km = request.args.get('km', 10, type=float)
+        if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            abort(400, message='lat and lng must be given in decimal degrees.')
+        max_km = current_app.config.get('NEARBY_MAX_KM', 500)
+        if not 0 < km <= max_km:
+            abort(400, message='km must be greater than 0 and at most {}.'.format(max_km))
+        return {'data': geo.nearby(latitude, longitude, km, limit=_limit())}
+
+
+class EntityMatches(Resource):
+    entity = None
+
+    def get(self, id):
+        # Top ?limit= candidates of the other side; see matching.py.
+        results = matching.matches(self.entity, id, limit=_limit())
+        if results is None:
+            abort(404, message='{} {} does not exist.'.format(self.entity.__name__, id))
+        return {'data': results}
+
+
+class VenueMatches(EntityMatches):
+    entity = Venue
+
+
+class ArtistList(EntityList):
+    entity = Artist
+
+
+class ArtistDetail(EntityDetail):
+    entity = Artist
+
+
+class ArtistSearch(EntitySearch):
+    entity = Artist
+
+
+class ArtistFacets(EntityFacets):
+    entity = Artist
+    method_decorators = [cached(['artists'])]
+
+
+class ArtistMatches(EntityMatches):
+    entity = Artist
+
+
+class ShowList(Resource):
+
+    def get(self):
+        # Same ordering, filters and cursors as the /shows page, plus
+        # ?venue_id= and ?artist_id=.
+        fields = _fields(SHOW_FIELDS, SHOW_FIELDS)
+        limit = _limit()
+        try:
+            start, end = (datetime.strptime(request.args[arg], '%Y-%m-%d') if request.args.get(arg) else None
+                          for arg in ('from', 'to'))
+        except ValueError:
+            abort(400, message='Dates must be given as YYYY-MM-DD.')
+
+        columns = [SHOW_FIELDS[field].label(field) for field in fields]
+        columns += [Show.start_time.label('_start_time'), Show.id.label('_id')]
+        query = db.session.query(*columns).select_from(Show)
+        if {'venue_name'} & set(fields):
+            query = query.join(Venue, Venue.id == Show.venue_id)
+        if {'artist_name', 'artist_image_link'} & set(fields):
+            query = query.join(Artist, Artist.id == Show.artist_id)
+
+        for arg, column in (('venue_id', Show.venue_id), ('artist_id', Show.artist_id)):
+            if request.args.get(arg):
+                query = query.filter(column == request.args.get(arg, type=int))
+        if request.args.get('upcoming'):
+            query = query.filter(Show.start_time > datetime.now())
+        if start is not None:
+            query = query.filter(Show.start_time >= start)
+        if end is not None:
+            query = query.filter(Show.start_time < end)
+        after = _after(decode_cursor)
+        if after is not None:
+            query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(*after))
+
+        rows = query.order_by(Show.start_time, Show.id).limit(limit + 1)
+        return _page(rows, fields, limit, lambda row: encode_cursor(row._start_time, row._id))
+
+
+api.add_resource(VenueList, '/venues')
+api.add_resource(VenueSearch, '/venues/search')
+api.add_resource(VenueFacets, '/venues/facets')
+api.add_resource(VenueAvailability, '/venues/available')
+api.add_resource(VenueNearby, '/venues/nearby')
+api.add_resource(VenueDetail, '/venues/<int:id>')
+api.add_resource(VenueMatches, '/venues/<int:id>/matches')
+api.add_resource(ArtistList, '/artists')
+api.add_resource(ArtistSearch, '/artists/search')
+api.add_resource(ArtistFacets, '/artists/facets')
+api.add_resource(ArtistDetail, '/artists/<int:id>')
+api.add_resource(ArtistMatches, '/artists/<int:id>/matches')
+api.add_resource(ShowList, '/shows')
+
+
+@blueprint.after_request
+def compress(response):
+    if (response.direct_passthrough or response.status_code != 200
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.headers.add('Vary', 'Accept-Encoding')
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    app.register_blueprint(blueprint)
@@ -1,45 +1,132 @@
 # ----------------------------------------------------------------------------#
 # Imports
 # ----------------------------------------------------------------------------#
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
 import logging
-from logging import Formatter, FileHandler
-from forms import *
-from flask_migrate import Migrate
-import sys
+import os
 import re
-from models import db, Show, Venue, Artist
+from datetime import datetime
+from functools import lru_cache
+from logging import Formatter, FileHandler
+
+from flask import Flask, render_template, request, Response, abort, jsonify, current_app
+
+from models import db
+import api
+import bookings
+import bulk
+import cache
+import counters
+import facets
+import geo
+import instrument
+import matching
+import metrics
+import partitions
+import plans
+import pooling
+import querycheck
+import seed
+import typeahead
 
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
+# create_app() builds the application; nothing is set up at import time.
+# Modules only a few requests or commands need (forms, Flask-Migrate, Babel)
+# are imported when first used, so a worker or CLI job starts quickly. See
+# benchmarks/startup.py for the cold-start budget.
+
+def create_app(config='config'):
+    # `config` is an import path or an object, as for app.config.from_object.
+    # The blueprints import helpers from this module.
+    from artists import blueprint as artists
+    from shows import blueprint as shows
+    from venues import blueprint as venues
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    db.init_app(app)
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        # Only `flask db ...` needs Flask-Migrate, and the flask command has
+        # loaded it (and alembic) already.
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    pooling.init_app(app)
+    metrics.init_app(app)
+    instrument.init_app(app)
+    querycheck.init_app(app)
+    typeahead.init_app(app)
+    plans.init_app(app)
+    cache.init_app(app)
+    bookings.init_app(app)
+    counters.init_app(app)
+    geo.init_app(app)
+    facets.init_app(app)
+    matching.init_app(app)
+    partitions.init_app(app)
+    bulk.init_app(app)
+    seed.init_app(app)
+    api.init_app(app)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/typeahead', 'typeahead_lookup', typeahead_lookup)
+    app.add_url_rule('/export/<kind>.<format>', 'export', export)
+    app.register_blueprint(venues)
+    app.register_blueprint(artists)
+    app.register_blueprint(shows)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+
+    if not app.debug and app.config.get('LOG_FILE'):
+        file_handler = FileHandler(app.config['LOG_FILE'])
+        file_handler.setFormatter(
+            Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db.init_app(app)
-migrate = Migrate(app, db)
+    return app
 
-# TODO: connect to a local postgresql database
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_datetime_format(format, locale):
+    # Compiled babel pattern and parsed locale, resolved once per pair
+    # instead of on every call.
+    import babel.dates
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
 
+def format_datetime(value, format='medium', locale=None):
+    # Views pass datetimes; ISO strings are still accepted.
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if locale is None:
+        import babel.dates
+        locale = babel.dates.LC_TIME
+    pattern, locale = compiled_datetime_format(format, locale)
+    return pattern.apply(value, locale)
+
+
+def stream_template(template_name, **context):
+    # Like render_template, but yields the page in chunks as it is rendered.
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(5)
+    return stream
 
-app.jinja_env.filters['datetime'] = format_datetime
 
 # ----------------------------------------------------------------------------#
 # AutoFormatting
@@ -52,490 +139,49 @@ def formaturl(url):
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
+# Venue, artist and show views live in the venues, artists and shows
+# blueprints.
 
-@app.route('/')
 def index():
     return render_template('pages/home.html')
 
 
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-    # TODO: replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per venue.
-    data = []
-    venues = Venue.query.order_by(Venue.state, Venue.city).all()
-    for venue in venues:
-        upcoming_shows = [show for show in venue.shows if show.start_time > datetime.today()]
-        venuedata = {'id': venue.id, 'name': venue.name, 'num_upcoming_shows': upcoming_shows}
-        if not data:
-            data.append({'city': venue.city, 'state': venue.state, 'venues': [venuedata]})
-        elif data[-1]['city'] == venue.city and data[-1]['state'] == venue.state:
-            data[-1]['venues'].append(venuedata)
-        else:
-            data.append({'city': venue.city, 'state': venue.state, 'venues': [venuedata]})
-
-    # print(data)
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # search for Hop should return "The Musical Hop".
-    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    data = []
-    search_term = request.form['search_term']
-    venues = Venue.query.filter(Venue.name.ilike('%{}%'.format(search_term))).all()
-    for venue in venues:
-        data.append({'id': venue.id, 'name': venue.name, 'num_upcoming_shows': len(venue.shows)})
-
-    response = {
-        "count": len(data),
-        "data": data
-    }
-    return render_template('pages/search_venues.html', results=response, search_term=search_term)
-
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    # TODO: replace with real venue data from the venues table, using venue_id
-    venue = Venue.query.get(venue_id)
-    # venue_upcoming_shows = [show for show in venue.shows if show.start_time > datetime.today()]
-    # Review: Use Join statement to retrieve Upcoming shows
-    venue_upcoming_shows = Show.query.join(Venue).filter(Show.venue_id==venue_id).filter(Show.start_time > datetime.today())
-
-    upcoming_shows = []
-    for show in venue_upcoming_shows:
-        upcoming_shows.append({'artist_id': show.artist_id,
-                               'artist_name': show.artist.name,
-                               'artist_image_link': show.artist.image_link,
-                               'start_time': show.start_time.isoformat()})
-
-    # venue_past_shows = [show for show in venue.shows if show.start_time < datetime.today()]
-    # Review: Use Join statement to retrieve Past shows
-    # Since venue_id is used as foreign key to join tables Venue and Show, querying on venue_id should
-    # help us narrow down the list from Venues table
-    venue_past_shows = Show.query.join(Venue).filter(Show.venue_id==venue_id).filter(Show.start_time < datetime.today())
-
-    past_shows = []
-    for show in venue_past_shows:
-        past_shows.append({'artist_id': show.artist_id,
-                           'artist_name': show.artist.name,
-                           'artist_image_link': show.artist.image_link,
-                           'start_time': show.start_time.isoformat()})
-
-    data = {'id': venue.id,
-            'name': venue.name,
-            'city': venue.city,
-            'state': venue.state,
-            'address': venue.address,
-            'phone': venue.phone,
-            'genres': venue.genres,
-            'image_link': venue.image_link,
-            'facebook_link': venue.facebook_link,
-            'website': venue.website,
-            'seeking_talent': venue.seeking_talent,
-            'seeking_description': venue.seeking_description,
-            'past_shows': past_shows,
-            'upcoming_shows': upcoming_shows,
-            'past_shows_count': len(past_shows),
-            'upcoming_shows_count': len(upcoming_shows)}
-
-    # print(data)
-    return render_template('pages/show_venue.html', venue=data)
-
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-    form = VenueForm()
-    return render_template('forms/new_venue.html', form=form)
-
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-    # TODO: insert form data as a new Venue record in the db, instead
-    # TODO: modify data to be the data object returned from db insertion
-    error = False
-
-    try:
-        venue = Venue(
-          name=request.form['name'],
-          city=request.form['city'],
-          state=request.form['state'],
-          address=request.form['address'],
-          phone=request.form['phone'],
-          genres=request.form.getlist('genres'),
-          facebook_link=formaturl(request.form.get('facebook_link')),
-          website=formaturl(request.form.get('website')),
-          image_link=formaturl(request.form.get('image_link')),
-          seeking_talent=request.form.get('seeking_talent') == 'y',
-          seeking_description=request.form.get('seeking_description')
-        )
-
-        db.session.add(venue)
-        db.session.commit()
-
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-
-    finally:
-        db.session.close()
-        if error:
-            flash('Internal server error: Unable to create a new venue ' + request.form['name'] + '!')
-        else:
-            flash('Venue ' + request.form['name'] + ' was successfully listed!')
-
-    # on successful db insert, flash success
-    # TODO: on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    return render_template('pages/home.html')
+def typeahead_lookup():
+    # Name suggestions for the search boxes, answered from memory.
+    kind = request.args.get('type')
+    if kind not in (None, 'venue', 'artist'):
+        abort(400)
+    return jsonify(results=typeahead.lookup(request.args.get('q', ''), kind=kind))
 
 
-@app.route('/venues/<venue_id>', methods=['POST'])
-def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-    error = False
-    venue = Venue.query.get(venue_id)
-    name = venue.name
-
-    try:
-        db.session.delete(venue)
-        db.session.commit()
-
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-
-    finally:
-        db.session.close()
-        if error:
-             flash('Internal server error: Venue - ' + name + ' could not be deleted.')
-        else:
-             flash('Venue ' + name + ' was deleted successfully!')
-
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
-    return render_template('pages/home.html')
+def export(kind, format):
+    if kind not in bulk.MODELS or format not in bulk.EXPORT_MIMETYPES:
+        abort(404)
+    # Rows are streamed from their own connection; no app context is needed.
+    rows = bulk.export_rows(db.engine, kind, format)
+    return Response(rows, mimetype=bulk.EXPORT_MIMETYPES[format], headers={
+        'Content-Disposition': 'attachment; filename={}.{}'.format(kind, format)})
 
 
-#  Artists
-#  ----------------------------------------------------------------
-@app.route('/artists')
-def artists():
-    # TODO: replace with real data returned from querying the database
-    return render_template('pages/artists.html', artists=Artist.query.all())
-
-
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-    # search for "band" should return "The Wild Sax Band".
-    data = []
-    search_term = request.form['search_term']
-    artists = Artist.query.filter(Artist.name.ilike('%{}%'.format(search_term))).all()
-    for artist in artists:
-        data.append({'id': artist.id, 'name': artist.name, 'num_upcoming_shows': len(artist.shows)})
-
-    response = {
-        "count": len(data),
-        "data": data
-    }
-
-    return render_template('pages/search_artists.html', results=response, search_term=search_term)
-
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # shows the venue page with the given venue_id
-    # TODO: replace with real artist data from the artists table, using artist_id
-    data = []
-    artist = Artist.query.get(artist_id)
-    # artist_upcoming_shows = [show for show in artist.shows if show.start_time > datetime.today()]
-    # Review: Use Join statement to retrieve Upcoming shows
-    # Since artist_id is used as foreign key to join tables Artist and Show, querying on artist_id should
-    # help us narrow down the list from Artists table
-
-    artist_upcoming_shows = Show.query.join(Artist).filter(Show.artist_id==artist_id).filter(Show.start_time > datetime.today())
-
-    upcoming_shows = []
-    for show in artist_upcoming_shows:
-        upcoming_shows.append({'venue_id': show.venue_id,
-                               'venue_name': show.venue.name,
-                               'venue_image_link': show.venue.image_link,
-                               'start_time': show.start_time.isoformat()})
-
-    # artist_past_shows = [show for show in artist.shows if show.start_time < datetime.today()]
-    artist_past_shows = Show.query.join(Artist).filter(Show.artist_id==artist_id).filter(Show.start_time < datetime.today())
-
-    past_shows = []
-    for show in artist_past_shows:
-        past_shows.append({'venue_id': show.venue_id,
-                           'venue_name': show.venue.name,
-                           'venue_image_link': show.venue.image_link,
-                           'start_time': show.start_time.isoformat()})
-
-    data.append({'id': artist.id,
-                 'name': artist.name,
-                 'city': artist.city,
-                 'state': artist.state,
-                 'phone': artist.phone,
-                 'genres': artist.genres,
-                 'image_link': artist.image_link,
-                 'facebook_link': artist.facebook_link,
-                 'website': artist.website,
-                 'seeking_venue': artist.seeking_venue,
-                 'seeking_description': artist.seeking_description,
-                 'past_shows': past_shows,
-                 'upcoming_shows': upcoming_shows,
-                 'past_shows_count': len(past_shows),
-                 'upcoming_shows_count': len(upcoming_shows)})
-
-    # print(data)
-    return render_template('pages/show_artist.html', artist=data[0])
-
-
-#  Update
-#  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-    form = ArtistForm()
-    # TODO: populate form with fields from artist with ID <artist_id>
-    return render_template('forms/edit_artist.html', form=form, artist=Artist.query.get(artist_id))
-
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-    # TODO: take values from the form submitted, and update existing
-    # artist record with ID <artist_id> using the new attributes
-    error = False
-    try:
-        artist = Artist.query.get(artist_id)
-        artist.name = request.form['name']
-        artist.city = request.form['city']
-        artist.state = request.form['state']
-        artist.phone = request.form['phone']
-        artist.genres = request.form.getlist('genres')
-        artist.image_link = request.form.get('image_link')
-        artist.facebook_link = request.form.get('facebook_link')
-        artist.website = request.form.get('website')
-        artist.seeking_venue = request.form.get('seeking_venue') == 'y'
-        artist.seeking_description = request.form.get('seeking_description')
-        db.session.add(artist)
-        db.session.commit()
-
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-
-    finally:
-        db.session.close()
-        if error:
-            flash('Internal server error: Failed to save the edited info for Artist: ' + request.form['name'] + '!')
-        else:
-            flash('Artist ' + request.form['name'] + ' info was updated successfully!')
-
-    return redirect(url_for('show_artist', artist_id=artist_id))
-
-
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-    form = VenueForm()
-    # TODO: populate form with values from venue with ID <venue_id>
-    return redirect(url_for('show_venue', venue_id=Venue.query.get(venue_id)))
-
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-    # TODO: take values from the form submitted, and update existing
-    # venue record with ID <venue_id> using the new attributes
-    error = False
-    try:
-        venue = Venue.query.get(venue_id)
-        venue.name = request.form['name']
-        venue.city = request.form['city']
-        venue.state = request.form['state']
-        venue.address = request.form['address']
-        venue.phone = request.form['phone']
-        venue.genres = request.form.getlist('genres')
-        venue.image_link = request.form.get('image_link')
-        venue.facebook_link = request.form.get('facebook_link')
-        venue.website = request.form.get('website')
-        venue.seeking_talent = request.form.get('seeking_talent') == 'y'
-        venue.seeking_description = request.form.get('seeking_description')
-        db.session.add(venue)
-        db.session.commit()
-
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-
-    finally:
-        db.session.close()
-        if error:
-            flash('Internal server error: Failed to save the edited info for venue: ' + request.form['name'] + '!')
-        else:
-            flash('Venue ' + request.form['name'] + ' info was updated successfully!')
-
-    return redirect(url_for('show_venue', venue_id=venue_id))
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-    form = ArtistForm()
-    return render_template('forms/new_artist.html', form=form)
-
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-    # called upon submitting the new artist listing form
-    # TODO: insert form data as a new Venue record in the db, instead
-    # TODO: modify data to be the data object returned from db insertion
-    error = False
-    try:
-        artist = Artist(
-          name=request.form['name'],
-          city=request.form['city'],
-          state=request.form['state'],
-          phone=request.form['phone'],
-          genres=request.form.getlist('genres'),
-          image_link=formaturl(request.form.get('image_link')),
-          facebook_link=formaturl(request.form.get('facebook_link')),
-          website=formaturl(request.form.get('website')),
-          seeking_venue=request.form.get('seeking_venue') == 'y',
-          seeking_description=request.form.get('seeking_description')
-        )
-
-        db.session.add(artist)
-        db.session.commit()
-
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-
-    finally:
-        db.session.close()
-        if error:
-            flash('Internal server error: Unable to create a new artist ' + request.form['name'] + '!')
-        else:
-            flash('Artist ' + request.form['name'] + ' was successfully listed!')
-
-    # TODO: on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
-    return render_template('pages/home.html')
-
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    #       num_shows should be aggregated based on number of upcoming shows per venue.
-    data = []
-    shows = Show.query.all()
-    for show in shows:
-        data.append({'venue_id': show.venue.id,
-                     'venue_name': show.venue.name,
-                     'artist_id': show.artist.id,
-                     'artist_name': show.artist.name,
-                     'artist_image_link': show.artist.image_link,
-                     'start_time': show.start_time.isoformat()
-                     })
-
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
-def create_shows():
-    # renders form. do not touch.
-    form = ShowForm()
-    return render_template('forms/new_show.html', form=form)
-
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-    # called to create new shows in the db, upon submitting new show listing form
-    # TODO: insert form data as a new Show record in the db, instead
-    error = False
-    try:
-        show = Show(artist_id=request.form['artist_id'],
-                    venue_id=request.form['venue_id'],
-                    start_time=request.form['start_time'])
-
-        db.session.add(show)
-        db.session.commit()
-
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-
-    finally:
-        db.session.close()
-        if error:
-            flash('Internal Error: Unable to add a show!')
-        else:
-            flash('Show was successfully listed!')
-
-    # on successful db insert, flash success
-    # flash('Show was successfully listed!')
-    # flash('Show was successfully listed!')
-    # TODO: on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Show could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    return render_template('pages/home.html')
-
-
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
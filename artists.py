@@ -0,0 +1,154 @@
+# ----------------------------------------------------------------------------#
+# Artists.
+# ----------------------------------------------------------------------------#
+# Listing, search, detail, create and edit views for artists. Forms are
+# imported inside the views that render them.
+import sys
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for, abort
+
+import typeahead
+from app import formaturl
+from cache import cached, conditional
+from models import db, Artist
+from queries import artist_detail, artist_validators
+from routing import read_only
+from search import search
+
+blueprint = Blueprint('artists', __name__, url_prefix='/artists')
+
+
+@blueprint.route('')
+@cached(['artists'])
+def artists():
+    # TODO: replace with real data returned from querying the database
+    return render_template('pages/artists.html', artists=Artist.query.all())
+
+
+@blueprint.route('/search', methods=['POST'])
+@read_only
+def search_artists():
+    # Case-insensitive, ranked search over artist name, city and genres.
+    # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    search_term = request.form['search_term']
+    data = search(Artist, search_term)
+
+    response = {
+        "count": len(data),
+        "data": data
+    }
+
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+
+@blueprint.route('/<int:artist_id>')
+@conditional(artist_validators)
+@cached(lambda artist_id: ['artist:{}'.format(artist_id)])
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # The artist, its shows and their venues are loaded in one query and
+    # split into past/upcoming in a single pass.
+    data = artist_detail(artist_id)
+    if data is None:
+        abort(404)
+
+    return render_template('pages/show_artist.html', artist=data)
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+@blueprint.route('/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+    # TODO: populate form with fields from artist with ID <artist_id>
+    return render_template('forms/edit_artist.html', form=form, artist=Artist.query.get(artist_id))
+
+
+@blueprint.route('/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+    error = False
+    try:
+        artist = Artist.query.get(artist_id)
+        artist.name = request.form['name']
+        artist.city = request.form['city']
+        artist.state = request.form['state']
+        artist.phone = request.form['phone']
+        artist.genres = request.form.getlist('genres')
+        artist.image_link = request.form.get('image_link')
+        artist.facebook_link = request.form.get('facebook_link')
+        artist.website = request.form.get('website')
+        artist.seeking_venue = request.form.get('seeking_venue') == 'y'
+        artist.seeking_description = request.form.get('seeking_description')
+        db.session.add(artist)
+        db.session.commit()
+        typeahead.index.add('artist', artist.id, artist.name)
+
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    finally:
+        db.session.close()
+        if error:
+            flash('Internal server error: Failed to save the edited info for Artist: ' + request.form['name'] + '!')
+        else:
+            flash('Artist ' + request.form['name'] + ' info was updated successfully!')
+
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@blueprint.route('/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@blueprint.route('/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    error = False
+    try:
+        artist = Artist(
+          name=request.form['name'],
+          city=request.form['city'],
+          state=request.form['state'],
+          phone=request.form['phone'],
+          genres=request.form.getlist('genres'),
+          image_link=formaturl(request.form.get('image_link')),
+          facebook_link=formaturl(request.form.get('facebook_link')),
+          website=formaturl(request.form.get('website')),
+          seeking_venue=request.form.get('seeking_venue') == 'y',
+          seeking_description=request.form.get('seeking_description')
+        )
+
+        db.session.add(artist)
+        db.session.commit()
+        typeahead.index.add('artist', artist.id, artist.name)
+
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    finally:
+        db.session.close()
+        if error:
+            flash('Internal server error: Unable to create a new artist ' + request.form['name'] + '!')
+        else:
+            flash('Artist ' + request.form['name'] + ' was successfully listed!')
+
+    # TODO: on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
+    return render_template('pages/home.html')
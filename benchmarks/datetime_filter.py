@@ -0,0 +1,49 @@
+# ----------------------------------------------------------------------------#
+# Micro-benchmark of the `datetime` template filter.
+# ----------------------------------------------------------------------------#
+# Compares the previous filter (dateutil parse of an ISO string plus
+# babel.dates.format_datetime) with the current one (datetime in, cached
+# compiled pattern). Run from the project root:
+#
+#     python benchmarks/datetime_filter.py [-n 100000]
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import format_datetime  # noqa: E402
+
+
+def previous_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    value = datetime(2035, 4, 1, 20, 0)
+    assert previous_format_datetime(value.isoformat(), 'full') == format_datetime(value, 'full')
+
+    cases = [
+        ('previous (iso string)', lambda: previous_format_datetime(value.isoformat(), 'full')),
+        ('current (datetime)', lambda: format_datetime(value, 'full')),
+    ]
+    for name, call in cases:
+        seconds = min(timeit.repeat(call, number=args.number, repeat=3))
+        print('{:<24} {:8.2f} us/call'.format(name, seconds / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# ----------------------------------------------------------------------------#
+# Detail page wall time under database latency.
+# ----------------------------------------------------------------------------#
+# Adds a fixed delay to every SQL statement, standing in for the round trip
+# to a remote database, and times first visits to venue and artist pages
+# (no If-None-Match, so the page is rendered) with the ETag lookup run
+# before the render and, with PARALLEL_QUERY_WORKERS, alongside it. Run
+# from the project root against a seeded database:
+#
+#     python benchmarks/detail_latency.py [--latency 5] [-n 100] [--workers 4]
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app  # noqa: E402
+from models import db, Venue, Artist  # noqa: E402
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=5.0, help='Milliseconds added per statement.')
+    parser.add_argument('-n', '--requests', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    app.config['PAGE_CACHE_BACKEND'] = None
+    app.extensions['page_cache'] = None
+    with app.app_context():
+        venue_ids = [id for id, in db.session.query(Venue.id).limit(1000)]
+        artist_ids = [id for id, in db.session.query(Artist.id).limit(1000)]
+        db.session.remove()
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def delay(*args_):
+        time.sleep(args.latency / 1000.0)
+
+    client = app.test_client()
+    print('{} ms per statement, {} requests per page'.format(args.latency, args.requests))
+    print('{:<12} {:>10} {:>10} {:>10}'.format('workers', 'page', 'p50 ms', 'mean ms'))
+    for workers in (0, args.workers):
+        app.config['PARALLEL_QUERY_WORKERS'] = workers
+        for page, ids in (('venues', venue_ids), ('artists', artist_ids)):
+            rng = random.Random(0)
+            timings = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = client.get('/{}/{}'.format(page, rng.choice(ids)))
+                response.get_data()
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200 and response.headers.get('ETag')
+            print('{:<12} {:>10} {:10.2f} {:10.2f}'.format(
+                workers or 'sequential', page, statistics.median(timings), statistics.mean(timings)))
+
+
+if __name__ == '__main__':
+    main()
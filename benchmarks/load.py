@@ -0,0 +1,223 @@
+# ----------------------------------------------------------------------------#
+# End-to-end load benchmark.
+# ----------------------------------------------------------------------------#
+# Drives every route (listings, detail pages, search, typeahead, the API and
+# the create forms, plus the create submissions with --writes) through the
+# app in-process, against the database in DATABASE_URL, and reports
+# throughput, p50/p95/p99 latency and SQL statements per request. Seed the
+# database first, e.g. `flask seed-data --scale medium --reset`. Run from
+# the project root:
+#
+#     python benchmarks/load.py [-n 200] [-c 4] [--routes show_venue,shows]
+#                               [--cache] [--writes] [--compare OLD.json]
+#
+# Results are written to benchmarks/results/<commit>-<database>.json for
+# comparison between commits. The page cache is off unless --cache is given,
+# so the numbers reflect the database work of each route.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app import create_app  # noqa: E402
+from models import db, Show, Venue, Artist  # noqa: E402
+
+app = create_app()
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+SEARCH_TERMS = ('blue', 'hall', 'the', 'wolves', 'san', 'jazz', 'ro', 'velvet room')
+
+
+def routes(venue_ids, artist_ids):
+    # name -> function(rng) returning (method, url, form data)
+    def venue(rng):
+        return rng.choice(venue_ids)
+
+    def artist(rng):
+        return rng.choice(artist_ids)
+
+    def show_form(rng):
+        start = datetime.now() + timedelta(days=rng.randint(1, 365))
+        return {'venue_id': venue(rng), 'artist_id': artist(rng),
+                'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}
+
+    def venue_form(rng):
+        return {'name': 'Benchmark Venue {}'.format(rng.randint(0, 10 ** 9)), 'city': 'Austin',
+                'state': 'TX', 'address': '1 Main St', 'phone': '512-555-0100', 'genres': 'Jazz',
+                'facebook_link': 'https://www.facebook.com/benchmark', 'website': 'https://example.com',
+                'image_link': 'https://example.com/venue.png'}
+
+    def artist_form(rng):
+        return {'name': 'Benchmark Artist {}'.format(rng.randint(0, 10 ** 9)), 'city': 'Austin',
+                'state': 'TX', 'phone': '512-555-0100', 'genres': 'Jazz',
+                'facebook_link': 'https://www.facebook.com/benchmark', 'website': 'https://example.com',
+                'image_link': 'https://example.com/artist.png'}
+
+    read = {
+        'index': lambda rng: ('GET', '/', None),
+        'venues': lambda rng: ('GET', '/venues', None),
+        'venues?page': lambda rng: ('GET', '/venues?page={}'.format(rng.randint(1, 2)), None),
+        'show_venue': lambda rng: ('GET', '/venues/{}'.format(venue(rng)), None),
+        'artists': lambda rng: ('GET', '/artists', None),
+        'show_artist': lambda rng: ('GET', '/artists/{}'.format(artist(rng)), None),
+        'shows': lambda rng: ('GET', '/shows', None),
+        'shows?upcoming': lambda rng: ('GET', '/shows?upcoming=1', None),
+        'search_venues': lambda rng: ('POST', '/venues/search', {'search_term': rng.choice(SEARCH_TERMS)}),
+        'search_artists': lambda rng: ('POST', '/artists/search', {'search_term': rng.choice(SEARCH_TERMS)}),
+        'typeahead': lambda rng: ('GET', '/typeahead?q={}'.format(rng.choice(SEARCH_TERMS)[:2]), None),
+        'api_venues': lambda rng: ('GET', '/api/v1/venues?fields=id,name,num_upcoming_shows', None),
+        'api_venue': lambda rng: ('GET', '/api/v1/venues/{}'.format(venue(rng)), None),
+        'api_shows': lambda rng: ('GET', '/api/v1/shows?upcoming=1', None),
+        'create_venue_form': lambda rng: ('GET', '/venues/create', None),
+        'create_artist_form': lambda rng: ('GET', '/artists/create', None),
+        'create_show_form': lambda rng: ('GET', '/shows/create', None),
+    }
+    write = {
+        'create_venue_submission': lambda rng: ('POST', '/venues/create', venue_form(rng)),
+        'create_artist_submission': lambda rng: ('POST', '/artists/create', artist_form(rng)),
+        'create_show_submission': lambda rng: ('POST', '/shows/create', show_form(rng)),
+    }
+    return read, write
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of a sorted list.
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+
+def run_route(route, requests, concurrency, seed):
+    latencies = []
+    queries = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random('{}:{}'.format(seed, index))
+        client = app.test_client()
+        for _ in range(requests // concurrency + (index < requests % concurrency)):
+            method, url, data = route(rng)
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            response.close()
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors[0] += 1
+                if 'X-Query-Count' in response.headers:
+                    queries.append(int(response.headers['X-Query-Count']))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {'requests': len(latencies),
+            'errors': errors[0],
+            'rps': len(latencies) / wall if wall else None,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'queries': sum(queries) / len(queries) if queries else None}
+
+
+def commit_id():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old, new):
+    print('\n{:<26} {:>19} {:>19}'.format('vs ' + old['commit'], 'p50 ms', 'p95 ms'))
+    for name, result in new['routes'].items():
+        before = old['routes'].get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0
+            cells.append('{:7.2f} -> {:7.2f} {:+4.0f}%'.format(before[key], result[key], change))
+        print('{:<26} {} {}'.format(name, *cells))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests', type=int, default=200, help='Requests per route.')
+    parser.add_argument('-c', '--concurrency', type=int, default=1)
+    parser.add_argument('--routes', help='Comma-separated route names (default: all).')
+    parser.add_argument('--writes', action='store_true', help='Include the create submissions.')
+    parser.add_argument('--cache', action='store_true', help='Keep the page cache on.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<commit>-<database>.json).')
+    parser.add_argument('--compare', help='Earlier result file to compare against.')
+    args = parser.parse_args()
+
+    app.config['SQL_QUERY_COUNT_HEADER'] = True
+    # Failing requests are counted as errors rather than ending the run.
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    app.config['NPLUSONE_MODE'] = None
+    if not args.cache:
+        app.config['PAGE_CACHE_BACKEND'] = None
+        app.extensions['page_cache'] = None
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id).limit(10000)]
+        artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id).limit(10000)]
+        counts = {name: db.session.query(model).count()
+                  for name, model in (('venues', Venue), ('artists', Artist), ('shows', Show))}
+        db.session.remove()
+    if not venue_ids or not artist_ids:
+        sys.exit('The database is empty; run `flask seed-data` first.')
+
+    read, write = routes(venue_ids, artist_ids)
+    selected = dict(read, **write) if args.writes else dict(read)
+    if args.routes:
+        names = args.routes.split(',')
+        unknown = [name for name in names if name not in read and name not in write]
+        if unknown:
+            sys.exit('Unknown routes: {}. Available: {}.'.format(', '.join(unknown),
+                                                                 ', '.join(list(read) + list(write))))
+        selected = {name: dict(read, **write)[name] for name in names}
+
+    results = {'commit': commit_id(), 'date': datetime.now().isoformat(timespec='seconds'),
+               'database': dialect, 'catalog': counts, 'requests': args.requests,
+               'concurrency': args.concurrency, 'cache': args.cache, 'routes': {}}
+    print('{:<26} {:>8} {:>8} {:>8} {:>8} {:>8} {:>7}'.format(
+        'route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'errors'))
+    for name, route in selected.items():
+        result = run_route(route, args.requests, args.concurrency, args.seed)
+        results['routes'][name] = result
+        print('{:<26} {:8.1f} {:8.2f} {:8.2f} {:8.2f} {:>8} {:7d}'.format(
+            name, result['rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            '-' if result['queries'] is None else '{:.1f}'.format(result['queries']), result['errors']))
+
+    output = args.output or os.path.join(RESULTS_DIR, '{}-{}.json'.format(results['commit'], dialect))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nSaved {}'.format(output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
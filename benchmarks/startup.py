@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------#
+# Cold-start time.
+# ----------------------------------------------------------------------------#
+# Starts a fresh interpreter per run, as a newly forked worker or a CLI job
+# would, and times importing the app, create_app() and the first request to
+# the home page (which also loads the typeahead index, so it needs the
+# database in DATABASE_URL). Exits non-zero when the median time to a ready
+# app (import + create_app) is over the budget. Run from the project root:
+#
+#     python benchmarks/startup.py [-n 10] [--budget-ms 600] [--imports 15]
+#
+# --imports lists the slowest top-level imports of one run (python -X
+# importtime), to find what a regression pulled in.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ('import', 'create_app', 'ready', 'first_request')
+
+PROBE = '''
+import json, time, warnings
+warnings.simplefilter('ignore')
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+response = application.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'ready': created - started, 'first_request': served - created,
+                  'status': response.status_code}))
+'''
+
+
+def run_probe():
+    started = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=ROOT)
+    timings = json.loads(output.decode().strip().splitlines()[-1])
+    timings['process'] = time.perf_counter() - started
+    return timings
+
+
+def slowest_imports(count):
+    # Cumulative microseconds of the modules the app module imports.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    imports = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]
+        if len(name) - len(name.lstrip()) == 2:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=600,
+                        help='Largest acceptable median import + create_app time.')
+    parser.add_argument('--imports', type=int, default=0, help='List this many of the slowest imports.')
+    args = parser.parse_args()
+
+    runs = [run_probe() for _ in range(args.runs)]
+    if any(run['status'] >= 400 for run in runs):
+        sys.exit('The first request failed with status {}.'.format(runs[0]['status']))
+
+    print('{:<16} {:>10} {:>10}'.format('phase', 'median ms', 'max ms'))
+    for phase in PHASES + ('process',):
+        values = [run[phase] * 1000 for run in runs]
+        print('{:<16} {:10.1f} {:10.1f}'.format(phase, statistics.median(values), max(values)))
+
+    if args.imports:
+        print('\n{:<30} {:>10}'.format('import', 'ms'))
+        for cumulative, name in slowest_imports(args.imports):
+            print('{:<30} {:10.1f}'.format(name, cumulative / 1000.0))
+
+    ready = statistics.median(run['ready'] for run in runs) * 1000
+    if ready > args.budget_ms:
+        sys.exit('\nStartup takes {:.0f} ms, over the {:.0f} ms budget.'.format(ready, args.budget_ms))
+    print('\nStartup takes {:.0f} ms, within the {:.0f} ms budget.'.format(ready, args.budget_ms))
+
+
+if __name__ == '__main__':
+    main()
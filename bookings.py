@@ -0,0 +1,163 @@
+# ----------------------------------------------------------------------------#
+# Bookings.
+# ----------------------------------------------------------------------------#
+# A show occupies its venue from start_time to end_time, and a venue's shows
+# may not overlap. No show lasts longer than MAX_DURATION (on Postgres a
+# check constraint enforces it too), so every show that could overlap
+# [start, end) starts within (start - MAX_DURATION, end): one short range
+# scan of ix_show_venue_id_start_time per venue, however many shows the
+# table holds. The same bounds prune the partitions of a partitioned show.
+#
+# Show inserts and updates lock the venue row, then look for an overlapping
+# show and raise Conflict if there is one; bulk imports do the same per
+# batch. On Postgres with btree_gist, an exclusion constraint on an
+# unpartitioned show table backs this up.
+#
+# free(start, end) selects the venues with nothing booked in that window,
+# for /api/v1/venues/available.
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import DateTime, and_, event, exists, inspect, select
+
+from models import Show, Venue
+
+MAX_DURATION = timedelta(hours=24)
+
+# Rows per overlap query of a bulk batch, kept under SQLite's limit on bind
+# parameters.
+CHECK_CHUNK = {'sqlite': 150}
+DEFAULT_CHECK_CHUNK = 1000
+
+BATCH_CHECK = """
+WITH batch (n, venue_id, lower, start_time, end_time) AS (VALUES {values})
+SELECT n FROM batch WHERE EXISTS (
+    SELECT 1 FROM show
+    WHERE show.venue_id = batch.venue_id AND show.start_time > batch.lower
+      AND show.start_time < batch.end_time AND show.end_time > batch.start_time)
+"""
+
+
+class Conflict(ValueError):
+
+    def __init__(self, venue_id, show_ids):
+        super(Conflict, self).__init__('venue {} is already booked by show {}'.format(
+            venue_id, ', '.join(map(str, show_ids))))
+        self.venue_id = venue_id
+        self.show_ids = show_ids
+
+
+def default_end(start_time):
+    return start_time + timedelta(minutes=current_app.config.get('SHOW_DEFAULT_DURATION_MINUTES', 180))
+
+
+def validate(start_time, end_time):
+    if end_time <= start_time:
+        raise ValueError('a show must end after it starts')
+    if end_time - start_time > MAX_DURATION:
+        raise ValueError('a show may last at most {}'.format(MAX_DURATION))
+
+
+def overlapping(start_time, end_time, show=Show):
+    # Shows overlapping [start_time, end_time). The first bound follows from
+    # the others and MAX_DURATION; it is what limits the index scan.
+    return and_(show.start_time > start_time - MAX_DURATION,
+                show.start_time < end_time,
+                show.end_time > start_time)
+
+
+def free(start_time, end_time):
+    # Venues with no show overlapping [start_time, end_time).
+    return ~exists().where(and_(Show.venue_id == Venue.id, overlapping(start_time, end_time)))
+
+
+def lock(connection, venue_ids):
+    # Serializes bookings per venue for the rest of the transaction. Venues
+    # are locked in id order so concurrent batches cannot deadlock.
+    connection.execute(select([Venue.id]).where(
+        Venue.id.in_(sorted(set(venue_ids)))).order_by(Venue.id).with_for_update())
+
+
+def conflicts(connection, venue_id, start_time, end_time, exclude=None):
+    table = Show.__table__
+    query = select([table.c.id]).where(and_(table.c.venue_id == venue_id,
+                                            overlapping(start_time, end_time, table.c)))
+    if exclude is not None:
+        query = query.where(table.c.id != exclude)
+    return [id for id, in connection.execute(query.order_by(table.c.id).limit(5))]
+
+
+def conflicting_rows(connection, rows):
+    # rows: dicts with venue_id, start_time and end_time. Returns the
+    # positions of the rows that overlap an existing show, or an earlier row
+    # of the same venue.
+    # Plain driver placeholders: SQLAlchemy bind parameters cost more to
+    # build than the query takes to run.
+    dialect = connection.dialect
+    placeholder = '?' if dialect.paramstyle == 'qmark' else '%s'
+    process = DateTime().dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+    chunk_size = CHECK_CHUNK.get(dialect.name, DEFAULT_CHECK_CHUNK)
+    bad = set()
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        params = []
+        for n, row in enumerate(chunk, offset):
+            # The lower bound is computed here: SQLite cannot subtract an
+            # interval from a timestamp.
+            params += [n, row['venue_id'], process(row['start_time'] - MAX_DURATION),
+                       process(row['start_time']), process(row['end_time'])]
+        values = ', '.join(['({0}, {0}, {0}, {0}, {0})'.format(placeholder)] * len(chunk))
+        bad.update(n for n, in connection.execute(BATCH_CHECK.format(values=values), tuple(params)))
+
+    by_venue = {}
+    for n, row in enumerate(rows):
+        if n not in bad:
+            by_venue.setdefault(row['venue_id'], []).append(n)
+    for positions in by_venue.values():
+        # Kept rows do not overlap, so the last one kept ends latest.
+        end_time = None
+        for n in sorted(positions, key=lambda n: rows[n]['start_time']):
+            if end_time is not None and rows[n]['start_time'] < end_time:
+                bad.add(n)
+            else:
+                end_time = rows[n]['end_time']
+    return bad
+
+
+#  Model events
+#  ----------------------------------------------------------------
+
+def _check(connection, target, exclude=None):
+    validate(target.start_time, target.end_time)
+    lock(connection, [target.venue_id])
+    show_ids = conflicts(connection, target.venue_id, target.start_time, target.end_time, exclude)
+    if show_ids:
+        raise Conflict(target.venue_id, show_ids)
+
+
+def _show_inserting(mapper, connection, target):
+    if target.end_time is None and target.start_time is not None:
+        target.end_time = default_end(target.start_time)
+    _check(connection, target)
+
+
+def _show_updating(mapper, connection, target):
+    state = inspect(target)
+    start = state.attrs.start_time.history
+    if start.deleted and start.deleted[0] is not None and not state.attrs.end_time.history.has_changes():
+        # A show moved without a new end time keeps its duration.
+        target.end_time = target.end_time + (target.start_time - start.deleted[0])
+    if any(state.attrs[attribute].history.has_changes() for attribute in ('venue_id', 'start_time', 'end_time')):
+        _check(connection, target, exclude=target.id)
+
+
+_listeners = [
+    (Show, 'before_insert', _show_inserting),
+    (Show, 'before_update', _show_updating),
+]
+
+
+def init_app(app):
+    for target, name, listener in _listeners:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
@@ -0,0 +1,462 @@
+# ----------------------------------------------------------------------------#
+# Bulk import and export.
+# ----------------------------------------------------------------------------#
+# `flask import-data venues|artists|shows FILE` streams a CSV or JSON Lines
+# file into the database in batches: COPY on Postgres, executemany
+# elsewhere. Rows are validated before they reach the database, shows may
+# reference their venue and artist by id or by name, and every batch is
+# committed on its own. Shows that overlap another show at their venue are
+# rejected (see bookings.py). Rows that fail validation, or that the database
+# rejects, are reported and skipped without aborting the load.
+#
+# Exports (`/export/<kind>.<csv|jsonl>` and `flask export-data`) read from a
+# server-side cursor on a connection of their own and encode rows as they
+# arrive, so memory stays flat whatever the table size. They use the same
+# columns as imports, so an export can be loaded back as is.
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+import click
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+import bookings
+import cache
+import counters
+import geo
+from genres import GENRES, genre_mask
+from models import db, Show, Venue, Artist
+
+MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+COLUMNS = {
+    'venues': ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+               'facebook_link', 'website', 'seeking_talent', 'seeking_description', 'latitude', 'longitude'),
+    'artists': ('id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+                'facebook_link', 'website', 'seeking_venue', 'seeking_description'),
+    'shows': ('id', 'artist_id', 'venue_id', 'start_time', 'end_time'),
+}
+
+REQUIRED = {
+    'venues': ('name', 'city', 'state'),
+    'artists': ('name', 'city', 'state'),
+    'shows': ('start_time',),
+}
+
+BOOLEANS = {'1': True, 'true': True, 't': True, 'yes': True, 'y': True,
+            '0': False, 'false': False, 'f': False, 'no': False, 'n': False, '': False}
+
+
+class RowError(ValueError):
+    pass
+
+
+#  Reading
+#  ----------------------------------------------------------------
+
+def read_rows(stream, format):
+    # Yields (line number, raw dict) without reading the whole file.
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, RowError('invalid JSON: {}'.format(e))
+                continue
+            yield line_num, row if isinstance(row, dict) else RowError('expected a JSON object')
+    else:
+        raise ValueError('unknown format {!r}'.format(format))
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    try:
+        return BOOLEANS[(_text(value) or '').lower()]
+    except KeyError:
+        raise RowError('invalid boolean {!r}'.format(value))
+
+
+def _int(value, field):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError('invalid {} {!r}'.format(field, value))
+
+
+def _float(value, field):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise RowError('invalid {} {!r}'.format(field, value))
+
+
+def _genres(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        value = [genre.strip() for genre in value.split(',') if genre.strip()]
+    unknown = [genre for genre in value if genre not in GENRES]
+    if unknown:
+        raise RowError('unknown genres {}'.format(', '.join(map(repr, unknown))))
+    return list(value)
+
+
+def clean(kind, raw):
+    # Converts a raw row into column values, raising RowError if it is
+    # unusable. Show references by name are resolved later, per batch.
+    row = {}
+    for column in COLUMNS[kind]:
+        value = raw.get(column)
+        if column in ('id', 'artist_id', 'venue_id'):
+            row[column] = _int(value, column)
+        elif column == 'genres':
+            row[column] = _genres(value)
+        elif column in ('seeking_talent', 'seeking_venue'):
+            row[column] = _bool(value)
+        elif column in ('latitude', 'longitude'):
+            row[column] = _float(value, column)
+        elif column in ('start_time', 'end_time'):
+            try:
+                row[column] = datetime.fromisoformat(_text(value)) if _text(value) else None
+            except ValueError:
+                raise RowError('invalid {} {!r}'.format(column, value))
+        else:
+            row[column] = _text(value)
+    for column in REQUIRED[kind]:
+        if row[column] is None:
+            raise RowError('missing {}'.format(column))
+    if kind in ('venues', 'artists'):
+        row['genre_mask'] = genre_mask(row['genres'])
+    if kind == 'venues':
+        try:
+            geo.validate(row['latitude'], row['longitude'])
+        except ValueError as e:
+            raise RowError(str(e))
+        row['geo_cell'] = geo.cell(row['latitude'], row['longitude'])
+    if kind == 'shows':
+        if row['end_time'] is None:
+            row['end_time'] = bookings.default_end(row['start_time'])
+        try:
+            bookings.validate(row['start_time'], row['end_time'])
+        except ValueError as e:
+            raise RowError(str(e))
+        for side in ('artist', 'venue'):
+            if row[side + '_id'] is None:
+                name = _text(raw.get(side + '_name'))
+                if name is None:
+                    raise RowError('missing {0}_id or {0}_name'.format(side))
+                row[side + '_name'] = name
+    return row
+
+
+#  Writing
+#  ----------------------------------------------------------------
+
+def _resolve_shows(rows, rejects):
+    # Resolves venue/artist names to ids and checks that referenced ids
+    # exist, with one query per side for the whole batch.
+    resolved = rows
+    for side, model in (('artist', Artist), ('venue', Venue)):
+        names = {row[side + '_name'] for _, row in resolved if row.get(side + '_name')}
+        ids = {row[side + '_id'] for _, row in resolved if row[side + '_id'] is not None}
+        by_name = {}
+        if names:
+            for id, name in db.session.query(model.id, model.name).filter(model.name.in_(names)):
+                by_name.setdefault(name, []).append(id)
+        existing = set()
+        if ids:
+            existing = {id for id, in db.session.query(model.id).filter(model.id.in_(ids))}
+
+        kept = []
+        for line_num, row in resolved:
+            name = row.pop(side + '_name', None)
+            if name is not None:
+                matches = by_name.get(name, [])
+                if len(matches) != 1:
+                    rejects.append((line_num, row, '{} {} {!r}'.format(
+                        'ambiguous' if matches else 'unknown', side, name)))
+                    continue
+                row[side + '_id'] = matches[0]
+            elif row[side + '_id'] not in existing:
+                rejects.append((line_num, row, 'unknown {}_id {}'.format(side, row[side + '_id'])))
+                continue
+            kept.append((line_num, row))
+        resolved = kept
+    return resolved
+
+
+def _reject_overlaps(rows, rejects):
+    # Locks the batch's venues until it is committed, then drops the shows
+    # that overlap a booked show or an earlier show of the batch.
+    if not rows:
+        return rows
+    connection = db.session.connection()
+    bookings.lock(connection, [row['venue_id'] for _, row in rows])
+    bad = bookings.conflicting_rows(connection, [row for _, row in rows])
+    kept = []
+    for n, (line_num, row) in enumerate(rows):
+        if n in bad:
+            rejects.append((line_num, row, 'overlaps another show at venue {}'.format(row['venue_id'])))
+        else:
+            kept.append((line_num, row))
+    return kept
+
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return '{' + ','.join('"{}"'.format(item.replace('\\', '\\\\').replace('"', '\\"'))
+                              for item in value) + '}'
+    return value
+
+
+def _copy(connection, table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        table.name, ', '.join(columns)), buffer)
+
+
+def _write(connection, model, rows):
+    # Rows are grouped by their column set: COPY and executemany both need
+    # the same columns for every row, and explicit ids are optional.
+    now = datetime.utcnow()
+    groups = {}
+    for row in rows:
+        row = {column: value for column, value in row.items() if not (column == 'id' and value is None)}
+        row['created_at'] = row['updated_at'] = now
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for columns, group in groups.items():
+        if connection.dialect.name == 'postgresql':
+            _copy(connection, model.__table__, columns, group)
+        else:
+            connection.execute(model.__table__.insert(), group)
+
+    if model is Show:
+        # Keep the venue and artist pages' updated_at and show counters in
+        # step, as the model events do for single inserts.
+        for parent, column in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+            ids = {row[column] for row in rows}
+            connection.execute(parent.__table__.update().where(
+                parent.id.in_(ids)).values(updated_at=now))
+        counters.apply(connection, [(row['venue_id'], row['artist_id'], row['start_time'], 1) for row in rows])
+
+
+def _write_batch(model, rows, rejects):
+    # Writes the batch in one transaction. If the database rejects it, the
+    # rows are retried one by one so only the offending ones are dropped.
+    # copy_expert raises the driver's own exceptions, not DBAPIError.
+    if not rows:
+        return 0
+    errors = (DBAPIError, db.engine.dialect.dbapi.Error)
+    try:
+        _write(db.session.connection(), model, [row for _, row in rows])
+        db.session.commit()
+        return len(rows)
+    except errors:
+        db.session.rollback()
+
+    written = 0
+    for line_num, row in rows:
+        try:
+            _write(db.session.connection(), model, [row])
+            db.session.commit()
+            written += 1
+        except errors as e:
+            db.session.rollback()
+            rejects.append((line_num, row, str(getattr(e, 'orig', e)).strip().splitlines()[0]))
+    return written
+
+
+def _fix_sequence(model):
+    # Explicit ids bypass the id sequence on Postgres.
+    if db.engine.dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce(max(id), 1)) FROM {0}".format(table))
+        db.session.commit()
+
+
+def load(kind, records, batch_size=5000, on_batch=None, on_reject=None):
+    # records: iterable of (line number, raw dict or RowError). Returns
+    # (rows written, rows rejected).
+    model = MODELS[kind]
+    written = rejected = 0
+    explicit_ids = False
+    batch_num = 0
+
+    def flush(batch, rejects):
+        nonlocal written, rejected, batch_num
+        started = time.perf_counter()
+        if kind == 'shows':
+            batch = _resolve_shows(batch, rejects)
+            batch = _reject_overlaps(batch, rejects)
+        count = _write_batch(model, batch, rejects)
+        elapsed = time.perf_counter() - started
+        written += count
+        rejected += len(rejects)
+        batch_num += 1
+        for reject in rejects:
+            if on_reject:
+                on_reject(*reject)
+        if on_batch:
+            on_batch(batch_num, count, len(rejects), elapsed)
+
+    batch, rejects = [], []
+    for line_num, raw in records:
+        if isinstance(raw, RowError):
+            rejects.append((line_num, None, str(raw)))
+            continue
+        try:
+            row = clean(kind, raw)
+        except RowError as e:
+            rejects.append((line_num, raw, str(e)))
+            continue
+        explicit_ids = explicit_ids or row['id'] is not None
+        batch.append((line_num, row))
+        if len(batch) >= batch_size:
+            flush(batch, rejects)
+            batch, rejects = [], []
+    if batch or rejects:
+        flush(batch, rejects)
+
+    if explicit_ids:
+        _fix_sequence(model)
+    return written, rejected
+
+
+#  Exporting
+#  ----------------------------------------------------------------
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def export_query(kind):
+    model = MODELS[kind]
+    table = model.__table__
+    columns = [table.c[column] for column in COLUMNS[kind]]
+    if kind != 'shows':
+        return select(columns).order_by(table.c.id)
+    # Names alongside the ids make the file readable and let it be imported
+    # into a database where the ids differ.
+    return select(
+        columns + [Artist.__table__.c.name.label('artist_name'), Venue.__table__.c.name.label('venue_name')]
+    ).select_from(
+        table.join(Artist.__table__).join(Venue.__table__)
+    ).order_by(table.c.id)
+
+
+def _export_value(value, format):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if format == 'csv':
+        if isinstance(value, list):
+            return ','.join(value)
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+    return value
+
+
+def export_rows(engine, kind, format, chunk_size=1000):
+    # Yields the export in chunks of chunk_size rows. The engine is passed in
+    # because streamed responses outlive the application context.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == 'csv' else None
+
+    def encode(rows, keys):
+        for row in rows:
+            values = [_export_value(value, format) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(keys, values))) + '\n')
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(export_query(kind))
+        keys = result.keys()
+        if writer:
+            yield encode([keys], keys)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield encode(rows, keys)
+
+
+def init_app(app):
+
+    @app.cli.command('import-data')
+    @click.argument('kind', type=click.Choice(sorted(MODELS)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+                  help='File format; guessed from the extension by default.')
+    @click.option('--batch-size', default=5000, show_default=True)
+    @click.option('--rejects', type=click.File('w'), help='Write rejected rows to this JSON Lines file.')
+    def import_data(kind, path, format, batch_size, rejects):
+        """Load venues, artists or shows from a CSV or JSON Lines file."""
+        format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+        def on_batch(num, count, rejected, elapsed):
+            click.echo('batch {}: {} rows, {} rejected in {:.2f}s ({:.0f} rows/s)'.format(
+                num, count, rejected, elapsed, count / elapsed if elapsed else 0))
+
+        def on_reject(line_num, row, error):
+            if rejects:
+                rejects.write(json.dumps({'line': line_num, 'error': error, 'row': row}, default=str) + '\n')
+            else:
+                click.echo('line {}: {}'.format(line_num, error), err=True)
+
+        started = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as stream:
+            written, rejected = load(kind, read_rows(stream, format), batch_size, on_batch, on_reject)
+        elapsed = time.perf_counter() - started
+        click.echo('{} {} imported, {} rejected in {:.1f}s ({:.0f} rows/s)'.format(
+            written, kind, rejected, elapsed, written / elapsed if elapsed else 0))
+
+        # Pages cached by this process or shared through the filesystem
+        # backend are stale now; per-worker memory caches expire on their own.
+        cache.clear()
+
+    @app.cli.command('export-data')
+    @click.argument('kind', type=click.Choice(sorted(MODELS)))
+    @click.argument('output', type=click.File('w'), default='-')
+    @click.option('--format', 'format', type=click.Choice(sorted(EXPORT_MIMETYPES)), default='csv',
+                  show_default=True)
+    def export_data(kind, output, format):
+        """Write venues, artists or shows as CSV or JSON Lines."""
+        for chunk in export_rows(db.engine, kind, format):
+            output.write(chunk)
@@ -0,0 +1,415 @@
+# ----------------------------------------------------------------------------#
+# Page cache.
+# ----------------------------------------------------------------------------#
+# Rendered GET responses are cached under a key built from the endpoint and
+# its arguments, and tagged with the records they show ('venue:3',
+# 'artist:7', 'shows', ...). Mapper events on Venue, Artist and Show collect
+# the tags a write affects, and the tags are evicted once the session
+# commits, so a cached page is dropped exactly when something it displays
+# changes. A page rendered before one of its tags was evicted is not stored,
+# so a render racing with a write cannot put stale data back in the cache.
+#
+# Detail pages also answer conditional GETs (ETag / Last-Modified) from their
+# updated_at columns, without rendering anything.
+#
+# PAGE_CACHE_BACKEND selects the storage:
+#   'memory'      an LRU dict per worker process (default)
+#   'filesystem'  files under PAGE_CACHE_DIR, shared by every worker on a host
+#   None          disables the cache
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+import parallel
+from models import Show, Venue, Artist
+
+
+class MemoryBackend(object):
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._evicted = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, tags, expires = entry
+            if expires is not None and expires < time.time():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags, timeout=None, started=None):
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            if started is not None and any(self._evicted.get(tag, 0) >= started for tag in tags):
+                return
+            self._discard(key)
+            self._entries[key] = (value, tags, expires)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.size:
+                self._discard(next(iter(self._entries)))
+
+    def evict(self, tags):
+        now = time.time()
+        with self._lock:
+            for tag in tags:
+                self._evicted[tag] = now
+                for key in list(self._tags.get(tag, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._evicted.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class FileSystemBackend(object):
+    # Entries are pickled to <dir>/entries/<hash>. Every tag is a directory
+    # under <dir>/tags holding an empty marker per tagged entry, so any
+    # process can evict a tag by walking its directory; the mtime of the
+    # directory's 'evicted' file records the last eviction. Files are written
+    # to a temporary name and renamed, so readers never see partial entries.
+
+    def __init__(self, path):
+        self.path = path
+        for sub in ('entries', 'tags'):
+            os.makedirs(os.path.join(path, sub), exist_ok=True)
+
+    def _name(self, value):
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, 'entries', self._name(key))
+
+    def _tag_path(self, tag):
+        return os.path.join(self.path, 'tags', self._name(tag))
+
+    def get(self, key):
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                stored_key, value, expires = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if stored_key != key or (expires is not None and expires < time.time()):
+            return None
+        return value
+
+    def set(self, key, value, tags, timeout=None, started=None):
+        if started is not None and any(self._evicted_at(tag) >= started for tag in tags):
+            return
+        expires = time.time() + timeout if timeout else None
+        entry_path = self._entry_path(key)
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.path, 'entries'))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((key, value, expires), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, entry_path)
+        for tag in tags:
+            tag_path = self._tag_path(tag)
+            os.makedirs(tag_path, exist_ok=True)
+            open(os.path.join(tag_path, os.path.basename(entry_path)), 'w').close()
+
+    def evict(self, tags):
+        for tag in tags:
+            tag_path = self._tag_path(tag)
+            os.makedirs(tag_path, exist_ok=True)
+            with open(os.path.join(tag_path, 'evicted'), 'w'):
+                pass
+            self._evict_dir(tag_path)
+
+    def _evicted_at(self, tag):
+        try:
+            return os.path.getmtime(os.path.join(self._tag_path(tag), 'evicted'))
+        except OSError:
+            return 0
+
+    def clear(self):
+        tags = os.path.join(self.path, 'tags')
+        for tag in os.listdir(tags):
+            self._evict_dir(os.path.join(tags, tag))
+
+    def _evict_dir(self, tag_path):
+        try:
+            markers = os.listdir(tag_path)
+        except OSError:
+            return
+        for marker in markers:
+            if marker == 'evicted':
+                continue
+            for path in (os.path.join(self.path, 'entries', marker), os.path.join(tag_path, marker)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def get_backend(app=None):
+    app = app or current_app
+    return app.extensions.get('page_cache')
+
+
+def clear():
+    backend = get_backend()
+    if backend is not None:
+        backend.clear()
+
+
+def cached(tags):
+    # Caches a GET view's response. `tags` is a list of tags, or a callable
+    # receiving the view arguments and returning one.
+    def decorator(view):
+
+        @wraps(view)
+        def wrapper(**kwargs):
+            backend = get_backend()
+            # Pages carrying flash messages are one-offs and must not be
+            # cached, nor served from the cache while messages are pending.
+            if backend is None or request.method != 'GET' or session.get('_flashes'):
+                return view(**kwargs)
+
+            started = time.time()
+            key = '{}?{}'.format(request.path, '&'.join(sorted(
+                '{}={}'.format(arg, value) for arg, value in request.args.items(multi=True))))
+            hit = backend.get(key)
+            if hit is not None:
+                body, status, headers = hit
+                return current_app.response_class(body, status=status, headers=headers)
+
+            response = current_app.make_response(view(**kwargs))
+            if response.status_code != 200:
+                return response
+
+            entry_tags = tags(**kwargs) if callable(tags) else tags
+            timeout = current_app.config.get('PAGE_CACHE_TIMEOUT')
+            # Cookies belong to the client that triggered the render.
+            headers = [(name, value) for name, value in response.headers
+                       if name not in ('Content-Length', 'Set-Cookie')]
+
+            def store(body):
+                backend.set(key, (body, response.status_code, headers), entry_tags, timeout, started)
+
+            if response.is_streamed:
+                # Keep streaming to the client and store the body once the
+                # whole page has been sent.
+                response.response = _tee(response.response, store)
+            else:
+                store(response.get_data())
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _http_validators(updated_at, last_started):
+    last_modified = updated_at
+    if last_started is not None:
+        last_modified = max(last_modified, datetime.utcfromtimestamp(last_started.timestamp()))
+    # HTTP dates have a resolution of one second.
+    last_modified = last_modified.replace(microsecond=0)
+    etag = hashlib.sha1('{}|{}'.format(
+        updated_at.isoformat(), last_started.isoformat() if last_started else ''
+    ).encode('utf-8')).hexdigest()
+    return etag, last_modified
+
+
+def _stamp(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Clients may keep the page but must revalidate it on every visit.
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(validators):
+    # Answers conditional GETs with 304 before the view runs. `validators`
+    # receives the view arguments and returns (updated_at, last_started) as
+    # naive UTC and local datetimes, or None to let the view handle a
+    # missing record.
+    def decorator(view):
+
+        @wraps(view)
+        def wrapper(**kwargs):
+            if parallel.enabled() and not (request.if_none_match or request.if_modified_since):
+                # Nothing to compare against, so the page is rendered anyway:
+                # look the validators up while the view runs.
+                pending = parallel.submit(validators, **kwargs)
+                response = current_app.make_response(view(**kwargs))
+                found = pending.result()
+                if found is None or response.status_code != 200:
+                    return response
+                return _stamp(response, *_http_validators(*found))
+
+            found = validators(**kwargs)
+            if found is None:
+                return view(**kwargs)
+
+            etag, last_modified = _http_validators(*found)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                if since is not None and since.tzinfo is not None:
+                    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+                not_modified = since is not None and last_modified <= since
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(**kwargs))
+            return _stamp(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
+
+
+def _tee(chunks, on_complete):
+    body = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        body.append(chunk)
+        yield chunk
+    on_complete(b''.join(body))
+
+
+#  Invalidation
+#  ----------------------------------------------------------------
+
+def _tag(target, *tags):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('page_cache_tags', set()).update(tags)
+
+
+def _changed(target, *attributes):
+    state = inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _venue_artists(connection, venue_id):
+    rows = connection.execute(select([Show.artist_id]).where(Show.venue_id == venue_id).distinct())
+    return ['artist:{}'.format(artist_id) for artist_id, in rows]
+
+
+def _artist_venues(connection, artist_id):
+    rows = connection.execute(select([Show.venue_id]).where(Show.artist_id == artist_id).distinct())
+    return ['venue:{}'.format(venue_id) for venue_id, in rows]
+
+
+def _venue_inserted(mapper, connection, target):
+    _tag(target, 'venues')
+
+
+def _venue_changed(mapper, connection, target):
+    _tag(target, 'venues', 'venue:{}'.format(target.id))
+    # Venue name and image are shown on the shows listing and on the pages
+    # of every artist that played there.
+    if _changed(target, 'name', 'image_link'):
+        _tag(target, 'shows', *_venue_artists(connection, target.id))
+
+
+def _venue_deleted(mapper, connection, target):
+    _tag(target, 'venues', 'venue:{}'.format(target.id), 'shows', *_venue_artists(connection, target.id))
+
+
+def _artist_inserted(mapper, connection, target):
+    _tag(target, 'artists')
+
+
+def _artist_changed(mapper, connection, target):
+    _tag(target, 'artists', 'artist:{}'.format(target.id))
+    if _changed(target, 'name', 'image_link'):
+        _tag(target, 'shows', *_artist_venues(connection, target.id))
+
+
+def _artist_deleted(mapper, connection, target):
+    _tag(target, 'artists', 'artist:{}'.format(target.id), 'shows', *_artist_venues(connection, target.id))
+
+
+def _show_changed(mapper, connection, target):
+    tags = ['shows', 'venue:{}'.format(target.venue_id), 'artist:{}'.format(target.artist_id)]
+    # A show moved to another venue or artist also leaves the old page.
+    state = inspect(target)
+    for attribute, prefix in (('venue_id', 'venue:'), ('artist_id', 'artist:')):
+        tags.extend(prefix + str(old) for old in state.attrs[attribute].history.deleted if old is not None)
+    _tag(target, *tags)
+
+
+def _after_commit(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if tags:
+        try:
+            backend = get_backend()
+        except RuntimeError:
+            # Outside an application context there is no cache to evict.
+            backend = None
+        if backend is not None:
+            backend.evict(tags)
+
+
+def _after_rollback(session):
+    session.info.pop('page_cache_tags', None)
+
+
+_listeners = [
+    (Venue, 'after_insert', _venue_inserted),
+    (Venue, 'after_update', _venue_changed),
+    (Venue, 'before_delete', _venue_deleted),
+    (Artist, 'after_insert', _artist_inserted),
+    (Artist, 'after_update', _artist_changed),
+    (Artist, 'before_delete', _artist_deleted),
+    (Show, 'after_insert', _show_changed),
+    (Show, 'after_update', _show_changed),
+    (Show, 'after_delete', _show_changed),
+    (Session, 'after_commit', _after_commit),
+    (Session, 'after_rollback', _after_rollback),
+]
+
+
+def init_app(app):
+    kind = app.config.get('PAGE_CACHE_BACKEND', 'memory')
+    if kind == 'memory':
+        backend = MemoryBackend(app.config.get('PAGE_CACHE_SIZE', 1024))
+    elif kind == 'filesystem':
+        backend = FileSystemBackend(app.config.get('PAGE_CACHE_DIR') or
+                                    os.path.join(tempfile.gettempdir(), 'fyyur-page-cache'))
+    elif kind is None:
+        backend = None
+    else:
+        raise ValueError('unknown PAGE_CACHE_BACKEND {!r}'.format(kind))
+    app.extensions['page_cache'] = backend
+
+    for target, name, listener in _listeners:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
@@ -0,0 +1,181 @@
+# ----------------------------------------------------------------------------#
+# Show counters.
+# ----------------------------------------------------------------------------#
+# Venue and Artist carry num_shows and num_upcoming_shows, so the directory,
+# the searches and the API read counts from the row instead of aggregating
+# the show table.
+#
+# "Upcoming" means starting after show_counts.rolled_at rather than after
+# now. `flask roll-show-counts`, run from cron every few minutes, moves the
+# shows that started since the last roll from upcoming to past and advances
+# rolled_at, so the counts trail the clock by at most the cron interval.
+#
+# Show inserts, deletes and moves adjust the counters of the venues and
+# artists involved in the same transaction, with one UPDATE per distinct
+# change at the end of the flush; bulk imports apply theirs per batch.
+# Writers read rolled_at FOR SHARE and the roll locks it FOR UPDATE, so no
+# show is counted against a watermark that moves before it commits.
+# `flask repair-show-counts` recomputes every counter from the show table.
+from datetime import datetime
+
+import click
+from sqlalchemy import and_, event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Show, Venue, Artist, ShowCounts
+
+PARENTS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def watermark(connection, for_update=False):
+    # Without a row (a database made by create_all) nothing has been rolled
+    # yet, so every show still counts as upcoming.
+    rolled_at = connection.execute(
+        select([ShowCounts.rolled_at]).where(ShowCounts.id == 1).with_for_update(read=not for_update)
+    ).scalar()
+    return rolled_at or datetime.min
+
+
+def _set_watermark(connection, rolled_at):
+    table = ShowCounts.__table__
+    if not connection.execute(table.update().where(table.c.id == 1).values(rolled_at=rolled_at)).rowcount:
+        connection.execute(table.insert().values(id=1, rolled_at=rolled_at))
+
+
+def apply(connection, changes):
+    # changes: (venue_id, artist_id, start_time, +1 or -1) per show added or
+    # removed. Parents with the same net change share one UPDATE.
+    rolled_at = watermark(connection)
+    deltas = {}
+    for venue_id, artist_id, start_time, sign in changes:
+        upcoming = sign if start_time > rolled_at else 0
+        for key in ((Venue, venue_id), (Artist, artist_id)):
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += sign
+            delta[1] += upcoming
+
+    groups = {}
+    for (model, id), (total, upcoming) in deltas.items():
+        if total or upcoming:
+            groups.setdefault((model, total, upcoming), []).append(id)
+    for (model, total, upcoming), ids in groups.items():
+        table = model.__table__
+        # Counters are derived data: updated_at is left alone.
+        connection.execute(table.update().where(table.c.id.in_(ids)).values(
+            num_shows=table.c.num_shows + total,
+            num_upcoming_shows=table.c.num_upcoming_shows + upcoming,
+            updated_at=table.c.updated_at))
+
+
+def roll(now=None):
+    # Moves the shows that started in (rolled_at, now] from upcoming to
+    # past. Returns the number of venue and artist rows changed.
+    now = now or datetime.now()
+    connection = db.session.connection()
+    rolled_at = watermark(connection, for_update=True)
+    if now <= rolled_at:
+        db.session.rollback()
+        return 0
+
+    started = and_(Show.start_time > rolled_at, Show.start_time <= now)
+    changed = 0
+    for model, show_fk in PARENTS:
+        table = model.__table__
+        count = select([func.count(Show.id)]).where(and_(show_fk == table.c.id, started)).as_scalar()
+        changed += connection.execute(table.update().where(
+            table.c.id.in_(select([show_fk]).where(started))
+        ).values(num_upcoming_shows=table.c.num_upcoming_shows - count,
+                 updated_at=table.c.updated_at)).rowcount
+    _set_watermark(connection, now)
+    db.session.commit()
+    return changed
+
+
+def repair(now=None):
+    # Recomputes every counter as of now and rolls the watermark there.
+    # Returns {model: rows that were wrong}.
+    now = now or datetime.now()
+    connection = db.session.connection()
+    watermark(connection, for_update=True)
+    fixed = {}
+    for model, show_fk in PARENTS:
+        table = model.__table__
+        total = select([func.count(Show.id)]).where(show_fk == table.c.id).as_scalar()
+        upcoming = select([func.count(Show.id)]).where(
+            and_(show_fk == table.c.id, Show.start_time > now)).as_scalar()
+        fixed[model] = connection.execute(table.update().where(
+            (table.c.num_shows != total) | (table.c.num_upcoming_shows != upcoming)
+        ).values(num_shows=total, num_upcoming_shows=upcoming, updated_at=table.c.updated_at)).rowcount
+    _set_watermark(connection, now)
+    db.session.commit()
+    return fixed
+
+
+#  Model events
+#  ----------------------------------------------------------------
+
+def _record(target, *changes):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('show_count_changes', []).extend(changes)
+
+
+def _committed(state, attribute):
+    history = state.attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(state.object, attribute)
+
+
+def _show_inserted(mapper, connection, target):
+    _record(target, (target.venue_id, target.artist_id, target.start_time, 1))
+
+
+def _show_updated(mapper, connection, target):
+    state = inspect(target)
+    attributes = ('venue_id', 'artist_id', 'start_time')
+    if any(state.attrs[attribute].history.has_changes() for attribute in attributes):
+        _record(target,
+                tuple(_committed(state, attribute) for attribute in attributes) + (-1,),
+                (target.venue_id, target.artist_id, target.start_time, 1))
+
+
+def _show_deleted(mapper, connection, target):
+    state = inspect(target)
+    _record(target, tuple(_committed(state, attribute) for attribute in ('venue_id', 'artist_id', 'start_time'))
+            + (-1,))
+
+
+def _after_flush(session, flush_context):
+    changes = session.info.pop('show_count_changes', None)
+    if changes:
+        apply(session.connection(), changes)
+
+
+def _after_rollback(session):
+    session.info.pop('show_count_changes', None)
+
+
+_listeners = [
+    (Show, 'after_insert', _show_inserted),
+    (Show, 'after_update', _show_updated),
+    (Show, 'after_delete', _show_deleted),
+    (Session, 'after_flush', _after_flush),
+    (Session, 'after_rollback', _after_rollback),
+]
+
+
+def init_app(app):
+    for target, name, listener in _listeners:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
+
+    @app.cli.command('roll-show-counts')
+    def roll_show_counts():
+        """Move shows that have started from the upcoming to the past counts."""
+        changed = roll()
+        click.echo('{} venue and artist counters updated'.format(changed))
+
+    @app.cli.command('repair-show-counts')
+    def repair_show_counts():
+        """Recompute every venue and artist show counter."""
+        fixed = repair()
+        click.echo('{} venues and {} artists corrected'.format(fixed[Venue], fixed[Artist]))
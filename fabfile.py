@@ -7,7 +7,9 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "FLASK_APP=app.py flask check-query-plans && python benchmarks/startup.py"
+            " && python benchmarks/load.py -n 20",
+            capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -0,0 +1,153 @@
+# ----------------------------------------------------------------------------#
+# Faceted browsing.
+# ----------------------------------------------------------------------------#
+# /api/v1/venues/facets and /api/v1/artists/facets count venues or artists
+# per genre, state, city and seeking flag, within the filters of
+# `conditions` (?genre=, ?state=, ?city=, ?seeking=), which the /venues and
+# /artists lists accept too.
+#
+# Genres are also stored as genre_mask, one bit per entry of GENRES, kept in
+# step with the genres array by the listeners below (and by bulk.py for
+# imports). A genre filter is then an integer test rather than an array
+# scan, and every facet comes out of one grouped query: GROUPING SETS on
+# Postgres, one GROUP BY per facet glued together with UNION ALL elsewhere.
+# Genres are grouped by whole mask, so there is a group per distinct genre
+# combination, and the counts are split per genre here. ix_venue_facets and
+# ix_artist_facets cover the query.
+#
+# The API caches the counts like pages, tagged 'venues' or 'artists'.
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import event, false, func, literal, null, select, tuple_, union_all
+
+from genres import GENRE_BITS, genre_mask, mask_genres
+from models import db, Venue, Artist
+
+SEEKING = {Venue: 'seeking_talent', Artist: 'seeking_venue'}
+
+COLUMNS = ('state', 'city', 'seeking', 'genre_mask')
+
+# facet -> the columns it is grouped by
+SETS = (
+    ('states', ('state',)),
+    ('cities', ('state', 'city')),
+    ('seeking', ('seeking',)),
+    ('genres', ('genre_mask',)),
+    ('total', ()),
+)
+
+
+def _columns(entity):
+    return {'state': entity.state,
+            'city': entity.city,
+            'seeking': func.coalesce(getattr(entity, SEEKING[entity]), false()),
+            'genre_mask': entity.genre_mask}
+
+
+def _set_id(grouped):
+    # What GROUPING(state, city, seeking, genre_mask) returns for the set:
+    # a bit per column left out, the first column highest.
+    return sum(1 << (len(COLUMNS) - 1 - i) for i, name in enumerate(COLUMNS) if name not in grouped)
+
+
+FACET_OF_SET = {_set_id(grouped): facet for facet, grouped in SETS}
+
+
+def conditions(entity, args):
+    # SQL conditions for ?genre= (repeatable, all must match), ?state=,
+    # ?city= (exact values, as the facets return them) and ?seeking=
+    # (true or false). Raises ValueError for arguments it cannot use.
+    columns = _columns(entity)
+    found = []
+    genres = args.getlist('genre')
+    unknown = [genre for genre in genres if genre not in GENRE_BITS]
+    if unknown:
+        raise ValueError('Unknown genres: {}.'.format(', '.join(unknown)))
+    if genres:
+        mask = genre_mask(genres)
+        found.append(entity.genre_mask.op('&')(mask) == mask)
+    for arg in ('state', 'city'):
+        if args.get(arg):
+            found.append(columns[arg] == args[arg])
+    seeking = args.get('seeking', '').lower()
+    if seeking:
+        if seeking not in ('true', 'false'):
+            raise ValueError('seeking must be true or false.')
+        found.append(columns['seeking'] == (seeking == 'true'))
+    return found
+
+
+def _grouped_rows(entity, where):
+    columns = _columns(entity)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        query = db.session.query(
+            *[columns[name].label(name) for name in COLUMNS],
+            func.grouping(*[columns[name] for name in COLUMNS]).label('facet_set'),
+            func.count().label('count')
+        ).filter(*where).group_by(
+            func.grouping_sets(*[tuple_(*[columns[name] for name in grouped]) for _, grouped in SETS]))
+        return query.all()
+
+    selects = []
+    for _, grouped in SETS:
+        query = select(
+            [(columns[name] if name in grouped else null()).label(name) for name in COLUMNS]
+            + [literal(_set_id(grouped)).label('facet_set'), func.count().label('count')]
+        ).select_from(entity.__table__).group_by(*[columns[name] for name in grouped])
+        for condition in where:
+            query = query.where(condition)
+        selects.append(query)
+    return db.session.execute(union_all(*selects)).fetchall()
+
+
+def _top(counts):
+    limit = current_app.config.get('BROWSE_FACET_LIMIT', 50)
+    return sorted(counts, key=lambda value: (-value['count'], str(value['value'])))[:limit]
+
+
+def facet_counts(entity, where=()):
+    # {'total': n, 'genres': [...], 'states': [...], 'cities': [...],
+    # 'seeking': [...]}, each facet a list of {'value': ..., 'count': n}
+    # (cities also give their 'state'), largest first.
+    total, genres = 0, Counter()
+    facets = {'states': [], 'cities': [], 'seeking': []}
+    for row in _grouped_rows(entity, where):
+        facet = FACET_OF_SET[row.facet_set]
+        if facet == 'total':
+            total = row.count
+        elif facet == 'genres':
+            for genre in mask_genres(row.genre_mask or 0):
+                genres[genre] += row.count
+        elif facet == 'seeking':
+            facets['seeking'].append({'value': bool(row.seeking), 'count': row.count})
+        elif facet == 'states' and row.state is not None:
+            facets['states'].append({'value': row.state, 'count': row.count})
+        elif facet == 'cities' and row.city is not None:
+            facets['cities'].append({'value': row.city, 'state': row.state, 'count': row.count})
+
+    result = {'total': total,
+              'genres': _top([{'value': genre, 'count': count} for genre, count in genres.items()])}
+    result.update((facet, _top(values)) for facet, values in facets.items())
+    return result
+
+
+#  Model events
+#  ----------------------------------------------------------------
+
+def _set_genre_mask(mapper, connection, target):
+    target.genre_mask = genre_mask(target.genres)
+
+
+_listeners = [
+    (Venue, 'before_insert', _set_genre_mask),
+    (Venue, 'before_update', _set_genre_mask),
+    (Artist, 'before_insert', _set_genre_mask),
+    (Artist, 'before_update', _set_genre_mask),
+]
+
+
+def init_app(app):
+    for target, name, listener in _listeners:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
@@ -0,0 +1,50 @@
+# ----------------------------------------------------------------------------#
+# Genres.
+# ----------------------------------------------------------------------------#
+
+# Every genre a venue or artist can list. A genre's position is its bit in
+# the genre_mask columns, so new genres must be appended.
+GENRES = (
+    'Alternative',
+    'Blues',
+    'Classical',
+    'Country',
+    'Electronic',
+    'Folk',
+    'Funk',
+    'Hip-Hop',
+    'Heavy Metal',
+    'Instrumental',
+    'Jazz',
+    'Musical Theatre',
+    'Pop',
+    'Punk',
+    'R&B',
+    'Reggae',
+    'Rock n Roll',
+    'Soul',
+    'Swing',
+    'Other',
+)
+
+
+def matching_genres(term):
+    # Genres whose name contains the search term, case-insensitively.
+    term = term.strip().lower()
+    if not term:
+        return []
+    return [genre for genre in GENRES if term in genre.lower()]
+
+
+GENRE_BITS = {genre: 1 << bit for bit, genre in enumerate(GENRES)}
+
+
+def genre_mask(genres):
+    mask = 0
+    for genre in genres or ():
+        mask |= GENRE_BITS.get(genre, 0)
+    return mask
+
+
+def mask_genres(mask):
+    return [genre for genre in GENRES if mask & GENRE_BITS[genre]]
@@ -0,0 +1,174 @@
+# ----------------------------------------------------------------------------#
+# Nearby venues.
+# ----------------------------------------------------------------------------#
+# Venues may carry a latitude and longitude, entered on the venue form. Each
+# located venue also stores geo_cell, the number of the 0.1 x 0.1 degree grid
+# cell it lies in, numbered row by row from the south-west so that a row's
+# cells are consecutive. A radius search turns the circle's bounding box into
+# one geo_cell range per row (fewer where whole rows merge), reads the venues
+# of those cells through ix_venue_geo_cell, and computes exact distances for
+# just those candidates.
+#
+# On Postgres with PostGIS installed, migration d2b7f19c6e05 also creates a
+# GiST index on the venue's geography point, and the search uses ST_DWithin
+# and ST_Distance instead.
+import math
+import threading
+
+from flask import current_app
+from sqlalchemy import cast, event, func, or_
+from sqlalchemy.types import UserDefinedType
+
+from models import db, Venue
+
+CELLS_PER_DEGREE = 10
+ROW_CELLS = 360 * CELLS_PER_DEGREE
+ROWS = 180 * CELLS_PER_DEGREE
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_postgis_lock = threading.Lock()
+_postgis = {}
+
+
+def cell(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return _row(latitude) * ROW_CELLS + _column(longitude)
+
+
+def _row(latitude):
+    return min(int(math.floor((latitude + 90) * CELLS_PER_DEGREE)), ROWS - 1)
+
+
+def _column(longitude):
+    return int(math.floor((longitude + 180) * CELLS_PER_DEGREE)) % ROW_CELLS
+
+
+def cell_ranges(latitude, longitude, km):
+    # (first, last) geo_cell ranges covering every point within km of the
+    # given one.
+    degrees = km / KM_PER_DEGREE
+    south, north = max(latitude - degrees, -90.0), min(latitude + degrees, 90.0)
+    # Longitude degrees are shortest on the box's edge nearest a pole.
+    edge = max(abs(south), abs(north))
+    span = degrees / math.cos(math.radians(edge)) if edge < 90 else 360
+    if span >= 180:
+        columns = [(0, ROW_CELLS - 1)]
+    else:
+        west, east = _column(longitude - span), _column(longitude + span)
+        columns = [(west, east)] if west <= east else [(west, ROW_CELLS - 1), (0, east)]
+
+    ranges = []
+    for row in range(_row(south), _row(north) + 1):
+        for first, last in columns:
+            first, last = row * ROW_CELLS + first, row * ROW_CELLS + last
+            if ranges and ranges[-1][1] + 1 == first:
+                ranges[-1] = (ranges[-1][0], last)
+            else:
+                ranges.append((first, last))
+    return ranges
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    # Haversine distance on a spherical earth.
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def validate(latitude, longitude):
+    if (latitude is None) != (longitude is None):
+        raise ValueError('latitude and longitude must be given together')
+    if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('latitude must be within [-90, 90] and longitude within [-180, 180]')
+
+
+def _uses_postgis(engine):
+    if engine.dialect.name != 'postgresql':
+        return False
+    if engine.url not in _postgis:
+        with _postgis_lock:
+            if engine.url not in _postgis:
+                with engine.connect() as conn:
+                    _postgis[engine.url] = bool(conn.execute(
+                        "SELECT 1 FROM pg_extension WHERE extname = 'postgis'").scalar())
+    return _postgis[engine.url]
+
+
+def _columns():
+    return [Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+            Venue.num_upcoming_shows]
+
+
+def _row_dict(row, distance):
+    return {'id': row.id,
+            'name': row.name,
+            'city': row.city,
+            'state': row.state,
+            'latitude': row.latitude,
+            'longitude': row.longitude,
+            'num_upcoming_shows': row.num_upcoming_shows,
+            'distance_km': round(distance, 3)}
+
+
+class _Geography(UserDefinedType):
+
+    def get_col_spec(self):
+        return 'geography'
+
+
+def _point(longitude, latitude):
+    # Must match the expression of ix_venue_geography.
+    return cast(func.ST_MakePoint(longitude, latitude), _Geography())
+
+
+def _nearby_postgis(latitude, longitude, km, limit):
+    venue, origin = _point(Venue.longitude, Venue.latitude), _point(longitude, latitude)
+    distance = func.ST_Distance(venue, origin).label('distance')
+    rows = db.session.query(*_columns() + [distance]).filter(
+        func.ST_DWithin(venue, origin, km * 1000)
+    ).order_by(distance, Venue.id).limit(limit)
+    return [_row_dict(row, row.distance / 1000) for row in rows]
+
+
+def _nearby_grid(latitude, longitude, km, limit):
+    rows = db.session.query(*_columns()).filter(
+        or_(*[Venue.geo_cell.between(first, last) for first, last in cell_ranges(latitude, longitude, km)])
+    )
+    hits = []
+    for row in rows:
+        distance = distance_km(latitude, longitude, row.latitude, row.longitude)
+        if distance <= km:
+            hits.append((distance, row.id, row))
+    hits.sort(key=lambda hit: hit[:2])
+    return [_row_dict(row, distance) for distance, _, row in hits[:limit]]
+
+
+def nearby(latitude, longitude, km, limit=None):
+    # Venues within km of the point, nearest first.
+    limit = limit or current_app.config.get('SEARCH_RESULT_LIMIT', 50)
+    if _uses_postgis(db.session.get_bind()):
+        return _nearby_postgis(latitude, longitude, km, limit)
+    return _nearby_grid(latitude, longitude, km, limit)
+
+
+#  Model events
+#  ----------------------------------------------------------------
+
+def _set_cell(mapper, connection, target):
+    target.geo_cell = cell(target.latitude, target.longitude)
+
+
+_listeners = [
+    (Venue, 'before_insert', _set_cell),
+    (Venue, 'before_update', _set_cell),
+]
+
+
+def init_app(app):
+    for target, name, listener in _listeners:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
@@ -0,0 +1,100 @@
+# ----------------------------------------------------------------------------#
+# Request instrumentation.
+# ----------------------------------------------------------------------------#
+# Records, per endpoint, the request latency and the number and total time
+# of the SQL statements a request issued, and exposes them through the
+# metrics registry (/metrics). Statements are timed with engine cursor
+# events and attributed to the request being served on the same thread.
+# Streamed pages are measured until the last chunk has been sent.
+#
+# With SQL_QUERY_COUNT_HEADER on, responses carry X-Query-Count and
+# X-Query-Time (milliseconds). For streamed pages these only cover the
+# statements issued before the first chunk.
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+request_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.')
+requests_total = metrics.counter(
+    'http_requests_total', 'Requests served, by endpoint, method and status.')
+request_queries = metrics.histogram(
+    'db_queries_per_request', 'SQL statements issued per request, by endpoint.',
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200))
+request_sql_time = metrics.histogram(
+    'db_sql_seconds_per_request', 'Time spent in SQL per request, by endpoint.')
+statements_total = metrics.counter(
+    'db_statements_total', 'SQL statements executed.')
+statement_duration = metrics.histogram(
+    'db_statement_duration_seconds', 'SQL statement execution time.')
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.finished = False
+
+
+def current_stats():
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    statements_total.inc()
+    statement_duration.observe(elapsed)
+    stats = current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_time += elapsed
+
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+
+def _finish_request(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+
+    if current_app.config.get('SQL_QUERY_COUNT_HEADER'):
+        response.headers['X-Query-Count'] = str(stats.queries)
+        response.headers['X-Query-Time'] = '{:.1f}'.format(stats.sql_time * 1000)
+
+    def observe():
+        if stats.finished:
+            return
+        stats.finished = True
+        request_latency.observe(time.perf_counter() - stats.started, endpoint=endpoint)
+        requests_total.inc(endpoint=endpoint, method=method, status=response.status_code)
+        request_queries.observe(stats.queries, endpoint=endpoint)
+        request_sql_time.observe(stats.sql_time, endpoint=endpoint)
+
+    # Runs once the server has sent the whole body, streamed or not.
+    response.call_on_close(observe)
+    return response
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                           ('after_cursor_execute', _after_cursor_execute)):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
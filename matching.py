@@ -0,0 +1,300 @@
+# ----------------------------------------------------------------------------#
+# Matchmaking.
+# ----------------------------------------------------------------------------#
+# /api/v1/venues/<id>/matches ranks the artists seeking a venue for that
+# venue, and /api/v1/artists/<id>/matches the venues seeking talent for that
+# artist. A candidate's score is a weighted sum (WEIGHTS) of:
+#
+#   genre      Jaccard similarity of the two genre sets
+#   location   1 in the same city, 0.5 in the same state
+#   history    half for past shows of this very pair (up to 3), half for
+#              the candidate's experience, log-scaled against the busiest
+#
+# Every worker keeps each side in memory as NumPy arrays sorted by id: genre
+# bitsets (the genre_mask columns), city and state codes, the seeking
+# flag and the show count. Scoring a subject is a handful of vectorized
+# operations over all candidates plus one indexed query for the pair's show
+# history, and argpartition picks the top k.
+#
+# The arrays are loaded on first use. Venue and artist writes made by this
+# worker update them when the session commits; every MATCH_REFRESH_SECONDS
+# the rows whose updated_at has moved are reloaded to pick up other workers'
+# writes. Deleted candidates drop out when the results are read back.
+import math
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Show, Venue, Artist
+
+WEIGHTS = {'genre': 0.6, 'location': 0.25, 'history': 0.15}
+
+# Past shows of a pair beyond this add nothing.
+HISTORY_CAP = 3
+
+# Rows are reloaded from a little before the last updated_at seen, so a
+# write that committed late with an earlier timestamp is not missed.
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+# Past this many changed rows (say after an import) a refresh reloads
+# everything, which is cheaper than updating row by row.
+REFRESH_MAX_ROWS = 1000
+
+_popcounts = None
+
+
+def _popcount(values):
+    import numpy as np
+    global _popcounts
+    if _popcounts is None:
+        table = np.zeros(1 << 16, dtype=np.uint8)
+        for bit in range(16):
+            table[1 << bit:1 << (bit + 1)] = table[:1 << bit] + 1
+        _popcounts = table
+    return _popcounts[values & 0xFFFF] + _popcounts[values >> 16]
+
+
+class Places(object):
+    # Small integer codes for city and state names, shared by both sides so
+    # they compare directly. 0 means unknown.
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def code(self, *parts):
+        if not all(parts):
+            return 0
+        key = tuple(part.strip().lower() for part in parts)
+        code = self._codes.get(key)
+        if code is None:
+            with self._lock:
+                code = self._codes.setdefault(key, len(self._codes) + 1)
+        return code
+
+
+places = Places()
+
+
+class Candidates(object):
+    # One side (venues or artists) as parallel arrays sorted by id.
+
+    def __init__(self, model, seeking):
+        self.model = model
+        self.seeking = seeking
+        self._lock = threading.RLock()
+        self.loaded_at = None
+        self.watermark = None
+
+    def _query(self):
+        model = self.model
+        return db.session.query(model.id, model.genre_mask, model.city, model.state,
+                                getattr(model, self.seeking), model.num_shows, model.updated_at)
+
+    def _values(self, row):
+        id, mask, city, state, seeking, num_shows = row[:6]
+        return id, mask or 0, places.code(city, state), places.code(state), bool(seeking), num_shows or 0
+
+    def load(self):
+        import numpy as np
+        rows = self._query().order_by(self.model.id).all()
+        columns = list(zip(*[self._values(row) for row in rows])) or [()] * 6
+        with self._lock:
+            self.ids = np.array(columns[0], dtype=np.int64)
+            self.masks = np.array(columns[1], dtype=np.uint32)
+            self.cities = np.array(columns[2], dtype=np.int32)
+            self.states = np.array(columns[3], dtype=np.int32)
+            self.eligible = np.array(columns[4], dtype=bool)
+            self.num_shows = np.array(columns[5], dtype=np.int64)
+            self.sizes = _popcount(self.masks)
+            self.watermark = max((row.updated_at for row in rows), default=None)
+            self.loaded_at = time.time()
+
+    def refresh(self):
+        # Reloads the rows written since the last load or refresh.
+        if self.watermark is None:
+            return self.load()
+        rows = self._query().filter(self.model.updated_at > self.watermark - REFRESH_OVERLAP).all()
+        if len(rows) > REFRESH_MAX_ROWS:
+            return self.load()
+        self.update([self._values(row) for row in rows])
+        with self._lock:
+            self.watermark = max([self.watermark] + [row.updated_at for row in rows])
+            self.loaded_at = time.time()
+
+    def update(self, values):
+        # values: (id, genre mask, city code, state code, seeking, number of
+        # shows) per row. Known ids are updated in place; new ones are
+        # inserted in id order.
+        import numpy as np
+        with self._lock:
+            for id, mask, city, state, seeking, num_shows in values:
+                i = int(np.searchsorted(self.ids, id))
+                if i == len(self.ids) or self.ids[i] != id:
+                    self.ids = np.insert(self.ids, i, id)
+                    self.masks = np.insert(self.masks, i, 0)
+                    self.cities = np.insert(self.cities, i, 0)
+                    self.states = np.insert(self.states, i, 0)
+                    self.eligible = np.insert(self.eligible, i, False)
+                    self.num_shows = np.insert(self.num_shows, i, 0)
+                    self.sizes = np.insert(self.sizes, i, 0)
+                self.masks[i] = mask
+                self.cities[i] = city
+                self.states[i] = state
+                self.eligible[i] = seeking
+                self.num_shows[i] = num_shows
+                self.sizes[i] = bin(mask).count('1')
+
+    def discard(self, ids):
+        import numpy as np
+        with self._lock:
+            positions = np.searchsorted(self.ids, ids)
+            positions = positions[positions < len(self.ids)]
+            positions = positions[np.isin(self.ids[positions], ids)]
+            self.eligible[positions] = False
+
+    def ready(self):
+        refresh = current_app.config.get('MATCH_REFRESH_SECONDS')
+        if self.loaded_at is None:
+            self.load()
+        elif refresh and time.time() - self.loaded_at > refresh:
+            self.refresh()
+        return self
+
+    def score(self, mask, city, state, history):
+        # Returns (positions, scores, parts) of every eligible candidate;
+        # history maps candidate ids to the number of shows with the subject.
+        import numpy as np
+        with self._lock:
+            ids, masks, sizes = self.ids, self.masks, self.sizes
+            cities, states = self.cities, self.states
+            eligible, num_shows = self.eligible, self.num_shows
+
+        common = _popcount(masks & np.uint32(mask))
+        union = sizes.astype(np.int32) + bin(mask).count('1') - common
+        genre = np.where(union > 0, common / np.maximum(union, 1), 0.0)
+
+        location = np.zeros(len(ids))
+        if state:
+            location[states == state] = 0.5
+        if city:
+            location[cities == city] = 1.0
+
+        played = np.zeros(len(ids))
+        if history:
+            history_ids = np.fromiter(history, dtype=np.int64, count=len(history))
+            counts = np.fromiter(history.values(), dtype=np.float64, count=len(history))
+            positions = np.searchsorted(ids, history_ids)
+            found = positions < len(ids)
+            found[found] = ids[positions[found]] == history_ids[found]
+            played[positions[found]] = np.minimum(counts[found], HISTORY_CAP) / HISTORY_CAP
+        busiest = num_shows.max() if len(num_shows) else 0
+        experience = np.log1p(num_shows) / math.log1p(busiest) if busiest else np.zeros(len(ids))
+        history_score = 0.5 * played + 0.5 * experience
+
+        total = WEIGHTS['genre'] * genre + WEIGHTS['location'] * location + WEIGHTS['history'] * history_score
+        total[~eligible] = -1.0
+        return ids, total, {'genre': genre, 'location': location, 'history': history_score}
+
+
+candidates = {Venue: Candidates(Venue, 'seeking_talent'), Artist: Candidates(Artist, 'seeking_venue')}
+
+# subject model -> (candidate model, subject's show column, candidate's show column)
+SIDES = {
+    Venue: (Artist, Show.venue_id, Show.artist_id),
+    Artist: (Venue, Show.artist_id, Show.venue_id),
+}
+
+
+def matches(model, id, limit=10):
+    # The `limit` best candidates for venue or artist `id`, best first, or
+    # None if it does not exist.
+    import numpy as np
+    subject = db.session.query(model.genre_mask, model.city, model.state).filter(model.id == id).first()
+    if subject is None:
+        return None
+    other, subject_fk, other_fk = SIDES[model]
+    history = dict(db.session.query(other_fk, func.count()).filter(subject_fk == id).group_by(other_fk))
+
+    ids, total, parts = candidates[other].ready().score(
+        subject.genre_mask or 0, places.code(subject.city, subject.state), places.code(subject.state), history)
+    count = min(limit, int((total >= 0).sum()))
+    if not count:
+        return []
+    top = np.argpartition(-total, count - 1)[:count]
+    top = top[np.lexsort((ids[top], -total[top]))]
+
+    rows = {row.id: row for row in db.session.query(
+        other.id, other.name, other.city, other.state, other.genres, other.image_link
+    ).filter(other.id.in_([int(i) for i in ids[top]]))}
+    gone = [int(ids[i]) for i in top if int(ids[i]) not in rows]
+    if gone:
+        candidates[other].discard(gone)
+
+    results = []
+    for i in top:
+        row = rows.get(int(ids[i]))
+        if row is None:
+            continue
+        result = {'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state,
+                  'genres': row.genres, 'image_link': row.image_link, 'score': round(float(total[i]), 4)}
+        result.update((part, round(float(values[i]), 4)) for part, values in parts.items())
+        results.append(result)
+    return results
+
+
+#  Model events
+#  ----------------------------------------------------------------
+
+def _record(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('match_changes', []).append(change)
+
+
+def _written(mapper, connection, target):
+    side = candidates[type(target)]
+    _record(target, (type(target), side._values((target.id, target.genre_mask, target.city, target.state,
+                                                getattr(target, side.seeking), target.num_shows))))
+
+
+def _deleted(mapper, connection, target):
+    _record(target, (type(target), target.id))
+
+
+def _after_commit(session):
+    for model, change in session.info.pop('match_changes', ()):
+        side = candidates[model]
+        # Before the first load there is nothing to update.
+        if side.loaded_at is None:
+            continue
+        if isinstance(change, tuple):
+            side.update([change])
+        else:
+            side.discard([change])
+
+
+def _after_rollback(session):
+    session.info.pop('match_changes', None)
+
+
+_listeners = [
+    (Venue, 'after_insert', _written),
+    (Venue, 'after_update', _written),
+    (Venue, 'after_delete', _deleted),
+    (Artist, 'after_insert', _written),
+    (Artist, 'after_update', _written),
+    (Artist, 'after_delete', _deleted),
+    (Session, 'after_commit', _after_commit),
+    (Session, 'after_rollback', _after_rollback),
+]
+
+
+def init_app(app):
+    for target, name, listener in _listeners:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
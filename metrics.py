@@ -0,0 +1,149 @@
+# ----------------------------------------------------------------------------#
+# Metrics.
+# ----------------------------------------------------------------------------#
+# A small in-process registry of counters, gauges and histograms, served in
+# the Prometheus text format at /metrics. Values are per worker process;
+# the scraper aggregates across workers.
+import threading
+from bisect import bisect_left
+
+from flask import Response
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_registry = {}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in key) + '}'
+
+
+class Metric(object):
+    kind = None
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        lines.extend('{}{} {}'.format(name, _format_labels(key), value)
+                     for name, key, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    # Either set explicitly, or computed at scrape time by `function`, which
+    # returns a number or a {labels dict key tuple: value} mapping.
+    kind = 'gauge'
+
+    def __init__(self, name, help, function=None):
+        super(Gauge, self).__init__(name, help)
+        self.function = function
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            values = value if isinstance(value, dict) else {(): value}
+        else:
+            with _lock:
+                values = dict(self._values)
+        return [(self.name, key, value) for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def samples(self):
+        with _lock:
+            values = [(key, list(counts), total) for key, (counts, total) in sorted(self._values.items())]
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((self.name + '_bucket', key + (('le', le),), cumulative))
+            samples.append((self.name + '_sum', key, total))
+            samples.append((self.name + '_count', key, cumulative))
+        return samples
+
+
+def _register(metric):
+    with _lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name, help):
+    return _register(Counter(name, help))
+
+
+def gauge(name, help, function=None):
+    return _register(Gauge(name, help, function))
+
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help, buckets))
+
+
+def render():
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
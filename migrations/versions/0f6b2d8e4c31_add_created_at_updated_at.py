@@ -0,0 +1,33 @@
+"""add created_at and updated_at
+
+Revision ID: 0f6b2d8e4c31
+Revises: e8a94c2f7d16
+Create Date: 2026-10-18 17:05:37.482190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0f6b2d8e4c31'
+down_revision = 'e8a94c2f7d16'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist', 'show')
+
+
+def upgrade():
+    # Existing rows are stamped with the migration time (UTC, like the
+    # application-side defaults).
+    for table in TABLES:
+        for column in ('created_at', 'updated_at'):
+            op.add_column(table, sa.Column(column, sa.DateTime(), nullable=False,
+                                           server_default=sa.text("timezone('utc', now())")))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'created_at')
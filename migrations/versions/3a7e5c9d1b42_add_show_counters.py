@@ -0,0 +1,46 @@
+"""add venue and artist show counters
+
+Revision ID: 3a7e5c9d1b42
+Revises: 0f6b2d8e4c31
+Create Date: 2026-10-18 14:20:11.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7e5c9d1b42'
+down_revision = '0f6b2d8e4c31'
+branch_labels = None
+depends_on = None
+
+PARENTS = (('venue', 'venue_id'), ('artist', 'artist_id'))
+
+
+def upgrade():
+    op.create_table('show_counts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rolled_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    for table, _ in PARENTS:
+        for column in ('num_shows', 'num_upcoming_shows'):
+            op.add_column(table, sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    # Counted as of the migration; show times are local, like now() here.
+    op.execute("INSERT INTO show_counts (id, rolled_at) VALUES (1, localtimestamp)")
+    for table, show_fk in PARENTS:
+        op.execute(
+            "UPDATE {table} SET num_shows = counts.total, num_upcoming_shows = counts.upcoming "
+            "FROM (SELECT {fk} AS id, count(*) AS total, "
+            "count(*) FILTER (WHERE start_time > localtimestamp) AS upcoming "
+            "FROM show GROUP BY {fk}) AS counts "
+            "WHERE {table}.id = counts.id".format(table=table, fk=show_fk))
+
+
+def downgrade():
+    for table, _ in reversed(PARENTS):
+        op.drop_column(table, 'num_upcoming_shows')
+        op.drop_column(table, 'num_shows')
+    op.drop_table('show_counts')
@@ -0,0 +1,41 @@
+"""add search indexes
+
+Revision ID: 5d0e7c41b8aa
+Revises: b3e51f0c9a2d
+Create Date: 2026-10-18 15:10:42.550917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0e7c41b8aa'
+down_revision = 'b3e51f0c9a2d'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = [
+    ('ix_venue_name_trgm', 'venue', 'name'),
+    ('ix_venue_city_trgm', 'venue', 'city'),
+    ('ix_artist_name_trgm', 'artist', 'name'),
+    ('ix_artist_city_trgm', 'artist', 'city'),
+]
+
+
+def upgrade():
+    # pg_trgm lets the GIN indexes answer both ILIKE '%term%' and the fuzzy
+    # `%` similarity operator used by search.py.
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(name, table, [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+    op.create_index('ix_venue_genres', 'venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'artist', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='artist')
+    op.drop_index('ix_venue_genres', table_name='venue')
+    for name, table, column in reversed(TRIGRAM_INDEXES):
+        op.drop_index(name, table_name=table)
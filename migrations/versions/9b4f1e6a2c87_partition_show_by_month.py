@@ -0,0 +1,99 @@
+"""partition show by month of start_time
+
+Revision ID: 9b4f1e6a2c87
+Revises: 3a7e5c9d1b42
+Create Date: 2026-10-18 15:02:44.118406
+
+"""
+from datetime import datetime
+
+from alembic import op
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4f1e6a2c87'
+down_revision = '3a7e5c9d1b42'
+branch_labels = None
+depends_on = None
+
+# Only applied with SHOW_PARTITIONING set. To change the setting later,
+# downgrade to 3a7e5c9d1b42 and upgrade again.
+
+COLUMNS = ('id', 'artist_id', 'venue_id', 'start_time', 'created_at', 'updated_at')
+
+TABLE = """
+CREATE TABLE {name} (
+    id integer NOT NULL DEFAULT nextval('show_id_seq'),
+    artist_id integer NOT NULL,
+    venue_id integer NOT NULL,
+    start_time timestamp without time zone NOT NULL,
+    created_at timestamp without time zone NOT NULL DEFAULT timezone('utc', now()),
+    updated_at timestamp without time zone NOT NULL DEFAULT timezone('utc', now()),
+    {primary_key}
+){partitioning}
+"""
+
+INDEXES = (
+    ('ix_show_start_time_id', 'start_time, id'),
+    ('ix_show_venue_id_start_time', 'venue_id, start_time'),
+    ('ix_show_artist_id_start_time', 'artist_id, start_time'),
+)
+
+
+def _month(value, offset=0):
+    months = value.year * 12 + value.month - 1 + offset
+    return datetime(months // 12, months % 12 + 1, 1)
+
+
+def _is_partitioned(conn):
+    return bool(conn.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'show' AND c.relnamespace = 'public'::regnamespace").scalar())
+
+
+def _finish(conn, table):
+    # Moves the id sequence, the name, the indexes and the foreign keys over
+    # to `table`, which replaces show.
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY {}.id'.format(table))
+    op.execute('DROP TABLE show')
+    op.execute('ALTER TABLE {} RENAME TO show'.format(table))
+    op.execute('ALTER TABLE show RENAME CONSTRAINT {}_pkey TO show_pkey'.format(table))
+    for name, columns in INDEXES:
+        op.execute('CREATE INDEX {} ON show ({})'.format(name, columns))
+    op.create_foreign_key('show_artist_id_fkey', 'show', 'artist', ['artist_id'], ['id'])
+    op.create_foreign_key('show_venue_id_fkey', 'show', 'venue', ['venue_id'], ['id'], ondelete='CASCADE')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or not current_app.config.get('SHOW_PARTITIONING'):
+        return
+
+    # The partition key has to be part of the primary key.
+    op.execute(TABLE.format(name='show_new', primary_key='PRIMARY KEY (id, start_time)',
+                            partitioning=' PARTITION BY RANGE (start_time)'))
+    now = datetime.now()
+    first = _month(conn.execute('SELECT min(start_time) FROM show').scalar() or now)
+    last = _month(now, current_app.config.get('SHOW_PARTITION_MONTHS_AHEAD', 12))
+    month = first
+    while month <= last:
+        op.execute("CREATE TABLE show_p{:%Y_%m} PARTITION OF show_new FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')"
+                   .format(month, month, _month(month, 1)))
+        month = _month(month, 1)
+    op.execute('CREATE TABLE show_default PARTITION OF show_new DEFAULT')
+
+    op.execute('INSERT INTO show_new ({0}) SELECT {0} FROM show'.format(', '.join(COLUMNS)))
+    _finish(conn, 'show_new')
+    op.execute('ANALYZE show')
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or not _is_partitioned(conn):
+        return
+
+    op.execute(TABLE.format(name='show_plain', primary_key='PRIMARY KEY (id)', partitioning=''))
+    op.execute('INSERT INTO show_plain ({0}) SELECT {0} FROM show'.format(', '.join(COLUMNS)))
+    # Dropping show drops its partitions, archive included.
+    _finish(conn, 'show_plain')
@@ -0,0 +1,24 @@
+"""add show start_time index
+
+Revision ID: b3e51f0c9a2d
+Revises: aeb28cd44741
+Create Date: 2026-10-18 14:02:11.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e51f0c9a2d'
+down_revision = 'aeb28cd44741'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
@@ -0,0 +1,63 @@
+"""add show end_time and booking constraints
+
+Revision ID: c4e81d3f7a52
+Revises: 9b4f1e6a2c87
+Create Date: 2026-10-18 16:11:27.905113
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e81d3f7a52'
+down_revision = '9b4f1e6a2c87'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.env')
+
+# Matches bookings.MAX_DURATION.
+MAX_DURATION = "interval '24 hours'"
+
+# Each overlapping pair once: b starts at or after a, before a ends.
+OVERLAPS = """
+SELECT count(*) FROM show a JOIN show b
+  ON b.venue_id = a.venue_id AND (b.start_time, b.id) > (a.start_time, a.id) AND b.start_time < a.end_time
+"""
+
+
+def _add_exclusion(conn):
+    # The database-side guard against double bookings. It needs btree_gist
+    # (for venue_id WITH =) and cannot be declared on a partitioned show,
+    # where bookings.py alone does the check.
+    if conn.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'show'::regclass").scalar():
+        return
+    if not conn.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gist'").scalar():
+        log.warning('btree_gist is not available; show has no exclusion constraint.')
+        return
+    overlaps = conn.execute(OVERLAPS).scalar()
+    if overlaps:
+        log.warning('%s pairs of shows already overlap; show has no exclusion constraint.', overlaps)
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute('ALTER TABLE show ADD CONSTRAINT ex_show_venue_time '
+               'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # Existing shows get the default length of SHOW_DEFAULT_DURATION_MINUTES.
+    op.execute("UPDATE show SET end_time = start_time + interval '180 minutes'")
+    op.alter_column('show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_show_duration', 'show',
+                               'end_time > start_time AND end_time <= start_time + {}'.format(MAX_DURATION))
+    _add_exclusion(op.get_bind())
+
+
+def downgrade():
+    op.execute('ALTER TABLE show DROP CONSTRAINT IF EXISTS ex_show_venue_time')
+    op.drop_constraint('ck_show_duration', 'show', type_='check')
+    op.drop_column('show', 'end_time')
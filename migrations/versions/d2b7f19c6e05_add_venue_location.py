@@ -0,0 +1,38 @@
+"""add venue location
+
+Revision ID: d2b7f19c6e05
+Revises: c4e81d3f7a52
+Create Date: 2026-10-18 17:42:08.316524
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b7f19c6e05'
+down_revision = 'c4e81d3f7a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venue', sa.Column('geo_cell', sa.Integer(), nullable=True))
+    op.create_index('ix_venue_geo_cell', 'venue', ['geo_cell'], unique=False)
+
+    # With PostGIS installed, geo.py searches with ST_DWithin; the expression
+    # must match geo._point.
+    conn = op.get_bind()
+    if conn.execute("SELECT 1 FROM pg_extension WHERE extname = 'postgis'").scalar():
+        op.execute('CREATE INDEX ix_venue_geography ON venue USING gist '
+                   '((CAST(ST_MakePoint(longitude, latitude) AS geography)))')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_venue_geography')
+    op.drop_index('ix_venue_geo_cell', table_name='venue')
+    op.drop_column('venue', 'geo_cell')
+    op.drop_column('venue', 'longitude')
+    op.drop_column('venue', 'latitude')
@@ -0,0 +1,32 @@
+"""add show venue/artist start_time indexes
+
+Revision ID: e8a94c2f7d16
+Revises: 5d0e7c41b8aa
+Create Date: 2026-10-18 16:21:05.104472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a94c2f7d16'
+down_revision = '5d0e7c41b8aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and does not
+    # block writes to show while the index is built.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_show_artist_id_start_time', table_name='show', postgresql_concurrently=True)
+        op.drop_index('ix_show_venue_id_start_time', table_name='show', postgresql_concurrently=True)
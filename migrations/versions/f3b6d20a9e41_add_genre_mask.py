@@ -0,0 +1,47 @@
+"""add genre_mask and facet indexes
+
+Revision ID: f3b6d20a9e41
+Revises: d2b7f19c6e05
+Create Date: 2026-10-18 19:05:44.172093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b6d20a9e41'
+down_revision = 'd2b7f19c6e05'
+branch_labels = None
+depends_on = None
+
+# genres.GENRES as of this revision; a genre's bit is its position.
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Swing', 'Other')
+
+BACKFILL = """
+UPDATE {table} SET genre_mask = (
+  SELECT coalesce(bit_or(1 << (array_position(CAST(:genres AS varchar[]), genre) - 1)), 0)
+  FROM unnest(genres) AS genre
+) WHERE genres IS NOT NULL
+"""
+
+TABLES = (('venue', 'seeking_talent'), ('artist', 'seeking_venue'))
+
+
+def upgrade():
+    conn = op.get_bind()
+    for table, seeking in TABLES:
+        op.add_column(table, sa.Column('genre_mask', sa.Integer(), server_default='0', nullable=False))
+        # Unknown genres have no bit.
+        conn.execute(sa.text(BACKFILL.format(table=table)), genres=list(GENRES))
+        op.create_index('ix_{}_facets'.format(table), table, ['state', 'city', seeking, 'genre_mask'],
+                        unique=False)
+        op.execute('ANALYZE {}'.format(table))
+
+
+def downgrade():
+    for table, _ in TABLES:
+        op.drop_index('ix_{}_facets'.format(table), table_name=table)
+        op.drop_column(table, 'genre_mask')
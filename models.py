@@ -1,12 +1,30 @@
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
 
-db = SQLAlchemy()
+from sqlalchemy import event, inspect
+
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# Genre lists are native arrays on Postgres and JSON lists on SQLite, which
+# is only used for local runs.
+GenreList = db.ARRAY(db.String()).with_variant(db.JSON(), 'sqlite')
 
 class Show(db.Model):
+    # On Postgres with SHOW_PARTITIONING the table is partitioned by month of
+    # start_time and its primary key is (id, start_time); see partitions.py.
     __tablename__ = 'show'
+    __table_args__ = (
+        # Backs the keyset-paginated /shows listing.
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        # Back the past/upcoming filters of the venue and artist pages and
+        # the upcoming-show counts of the directory and searches.
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -17,9 +35,21 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), nullable=False)
 
     start_time = db.Column(db.DateTime, nullable=False)
+    # Defaults to start_time plus SHOW_DEFAULT_DURATION_MINUTES. A venue's
+    # shows may not overlap; see bookings.py.
+    end_time = db.Column(db.DateTime, nullable=False)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        # Backs the nearby-venues search.
+        db.Index('ix_venue_geo_cell', 'geo_cell'),
+        # Covers the facet counts and genre filters of the browse API.
+        db.Index('ix_venue_facets', 'state', 'city', 'seeking_talent', 'genre_mask'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -31,24 +61,45 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String())
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GenreList)
     website = db.Column(db.String())
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
 
-    artists = db.relationship('Artist', secondary='show')
-    shows = db.relationship('Show')
+    # genres as a bitmask (see genres.GENRE_BITS), maintained by facets.py.
+    genre_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Optional, entered on the form. geo_cell is maintained by geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Maintained by counters.py.
+    num_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    artists = db.relationship('Artist', secondary='show', viewonly=True)
+    # Shows are deleted with their venue, through the ORM so their events
+    # (counters, page cache) fire.
+    shows = db.relationship('Show', cascade='save-update, merge, delete')
 
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        # Covers the facet counts and genre filters of the browse API.
+        db.Index('ix_artist_facets', 'state', 'city', 'seeking_venue', 'genre_mask'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String())
     state = db.Column(db.String())
     phone = db.Column(db.String())
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String())
     facebook_link = db.Column(db.String())
 
@@ -57,5 +108,70 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
 
-    venues = db.relationship('Venue', secondary='show')
-    shows = db.relationship('Show')
\ No newline at end of file
+    # genres as a bitmask (see genres.GENRE_BITS), maintained by facets.py.
+    genre_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Maintained by counters.py.
+    num_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    venues = db.relationship('Venue', secondary='show', viewonly=True)
+    # Shows are deleted with their artist, through the ORM so their events
+    # (counters, page cache) fire.
+    shows = db.relationship('Show', cascade='save-update, merge, delete')
+
+
+class ShowCounts(db.Model):
+    # A single row: the time up to which the num_upcoming_shows counters
+    # have been rolled forward (see counters.py).
+    __tablename__ = 'show_counts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_at = db.Column(db.DateTime, nullable=False)
+
+
+# ----------------------------------------------------------------------------#
+# Modification times.
+# ----------------------------------------------------------------------------#
+# A venue or artist page shows its shows and the name and image of the other
+# side of each show, so updated_at of the page's own row is bumped whenever
+# any of those change. That keeps one column per page enough to tell whether
+# the page changed.
+
+def _touch(connection, model, ids):
+    ids = [id for id in ids if id is not None]
+    if ids:
+        connection.execute(model.__table__.update().where(
+            model.id.in_(ids)).values(updated_at=datetime.utcnow()))
+
+
+def _touch_show_pages(mapper, connection, target):
+    state = inspect(target)
+    venue_ids = {target.venue_id}.union(state.attrs.venue_id.history.deleted)
+    artist_ids = {target.artist_id}.union(state.attrs.artist_id.history.deleted)
+    _touch(connection, Venue, venue_ids)
+    _touch(connection, Artist, artist_ids)
+
+
+def _touch_counterpart_pages(model, show_fk, counterpart_fk, on_delete=False):
+    # Bumps the pages of the other side of every show of the changed row:
+    # always when the row is deleted, otherwise only when the name or image
+    # displayed on those pages changed.
+    def listener(mapper, connection, target):
+        state = inspect(target)
+        if on_delete or state.attrs.name.history.has_changes() or state.attrs.image_link.history.has_changes():
+            counterparts = db.select([counterpart_fk]).where(show_fk == target.id)
+            connection.execute(model.__table__.update().where(
+                model.id.in_(counterparts)).values(updated_at=datetime.utcnow()))
+    return listener
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Show, _event, _touch_show_pages)
+event.listen(Venue, 'after_update', _touch_counterpart_pages(Artist, Show.venue_id, Show.artist_id))
+event.listen(Venue, 'before_delete', _touch_counterpart_pages(Artist, Show.venue_id, Show.artist_id, on_delete=True))
+event.listen(Artist, 'after_update', _touch_counterpart_pages(Venue, Show.artist_id, Show.venue_id))
+event.listen(Artist, 'before_delete', _touch_counterpart_pages(Venue, Show.artist_id, Show.venue_id, on_delete=True))
@@ -0,0 +1,44 @@
+# ----------------------------------------------------------------------------#
+# Concurrent queries.
+# ----------------------------------------------------------------------------#
+# A bounded thread pool for running independent database work of one request
+# side by side, so a page pays one round trip instead of one per query. Each
+# task runs in a copy of the request context on its own thread, and
+# therefore gets its own scoped session and pooled connection, with the same
+# routing and statement timeout as the request. Off unless
+# PARALLEL_QUERY_WORKERS is set.
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import copy_current_request_context, current_app, has_request_context
+
+_lock = threading.Lock()
+_executor = None
+
+
+def enabled():
+    return bool(current_app.config.get('PARALLEL_QUERY_WORKERS'))
+
+
+def _get_executor():
+    # Created on first use, so preforking servers start it in each worker.
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=current_app.config['PARALLEL_QUERY_WORKERS'],
+                                               thread_name_prefix='query')
+    return _executor
+
+
+def submit(function, *args, **kwargs):
+    # Returns a Future. Without a pool (or outside a request) the function
+    # runs right away on the calling thread.
+    if not enabled() or not has_request_context():
+        future = Future()
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_executor().submit(copy_current_request_context(function), *args, **kwargs)
@@ -0,0 +1,179 @@
+# ----------------------------------------------------------------------------#
+# Show partitions.
+# ----------------------------------------------------------------------------#
+# With SHOW_PARTITIONING set when migration 9b4f1e6a2c87 runs, show becomes a
+# table partitioned by month of start_time on Postgres:
+#
+#   show_pYYYY_MM   one partition per month
+#   show_archive    every month before the archive cutoff, in one partition
+#   show_default    shows outside all other partitions
+#
+# Queries that bound start_time (upcoming listings, the counter roll, the
+# past/upcoming filters) only touch the partitions of the months in range.
+# Run from cron:
+#
+#   flask create-show-partitions   adds the coming months' partitions ahead
+#                                  of time
+#   flask archive-shows            merges months older than
+#                                  SHOW_ARCHIVE_AFTER_MONTHS into show_archive
+#
+# Archived shows stay part of show, so past-show pages keep working. They
+# are rewritten densely, sorted by venue, into a partition that is never
+# updated, optionally in the SHOW_ARCHIVE_TABLESPACE tablespace on cheaper
+# storage, and the planner has one partition to consider for them instead
+# of one per month.
+import re
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from flask import current_app
+
+from models import db
+
+Partition = namedtuple('Partition', 'name lower upper rows bytes')
+
+_bounds = re.compile(r"FROM \((MINVALUE|'[^']*')\) TO \((MAXVALUE|'[^']*')\)")
+
+
+def _month(value, offset=0):
+    months = value.year * 12 + value.month - 1 + offset
+    return datetime(months // 12, months % 12 + 1, 1)
+
+
+def _bound(value):
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def is_partitioned(connection):
+    return connection.dialect.name == 'postgresql' and bool(connection.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'show' AND c.relnamespace = 'public'::regnamespace").scalar())
+
+
+def partitions(connection):
+    # Partitions of show in start_time order, the default one last. lower
+    # and upper are None for MINVALUE/MAXVALUE (and for the default).
+    rows = connection.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples, pg_total_relation_size(c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'show'::regclass")
+    result = []
+    for name, bound, rows_estimate, size in rows:
+        match = _bounds.search(bound)
+        lower, upper = (_bound(match.group(1)), _bound(match.group(2))) if match else (None, None)
+        result.append(Partition(name, lower, upper, max(int(rows_estimate), 0), size))
+    return sorted(result, key=lambda p: (p.name == 'show_default', p.lower or datetime.min))
+
+
+def _move_from_default(connection, table, condition, params):
+    # Rows that landed in the default partition must leave it before a
+    # partition covering them can be attached.
+    connection.execute(
+        'WITH moved AS (DELETE FROM show_default WHERE {} RETURNING *) '
+        'INSERT INTO {} SELECT * FROM moved'.format(condition, table), params)
+
+
+def create(months_ahead, now=None):
+    # Adds the missing monthly partitions from the current month to
+    # months_ahead months out. Returns the names of the partitions created.
+    connection = db.session.connection()
+    existing = partitions(connection)
+    created = []
+    month = _month(now or datetime.now())
+    last = _month(month, months_ahead)
+    while month <= last:
+        following = _month(month, 1)
+        covered = any(p.lower is not None and p.lower <= month and p.upper is not None and following <= p.upper
+                      for p in existing)
+        if not covered:
+            name = 'show_p{:%Y_%m}'.format(month)
+            connection.execute('CREATE TABLE {} (LIKE show INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name))
+            _move_from_default(connection, name, 'start_time >= %(lower)s AND start_time < %(upper)s',
+                               {'lower': month, 'upper': following})
+            connection.execute(
+                'ALTER TABLE show ATTACH PARTITION {} FOR VALUES FROM (%(lower)s) TO (%(upper)s)'.format(name),
+                {'lower': month, 'upper': following})
+            created.append(name)
+        month = following
+    db.session.commit()
+    return created
+
+
+def archive(before, tablespace=None):
+    # Merges the monthly partitions that end on or before `before` into
+    # show_archive. Returns the names of the partitions merged. Detaching
+    # and attaching lock show briefly, so run it off-peak.
+    connection = db.session.connection()
+    existing = partitions(connection)
+    months = [p for p in existing if p.name.startswith('show_p') and p.upper is not None and p.upper <= before]
+    if not months:
+        return []
+    upper = max(p.upper for p in months)
+
+    if any(p.name == 'show_archive' for p in existing):
+        connection.execute('ALTER TABLE show DETACH PARTITION show_archive')
+    else:
+        connection.execute(
+            'CREATE TABLE show_archive (LIKE show INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'WITH (fillfactor = 100){}'.format(' TABLESPACE {}'.format(tablespace) if tablespace else ''))
+    for partition in months:
+        connection.execute('ALTER TABLE show DETACH PARTITION {}'.format(partition.name))
+        # Sorted so each venue's archived shows sit together on disk.
+        connection.execute('INSERT INTO show_archive SELECT * FROM {} ORDER BY venue_id, start_time'
+                           .format(partition.name))
+        connection.execute('DROP TABLE {}'.format(partition.name))
+    if any(p.name == 'show_default' for p in existing):
+        _move_from_default(connection, 'show_archive', 'start_time < %(upper)s', {'upper': upper})
+
+    # A matching CHECK constraint spares the attach a scan of the archive.
+    connection.execute('ALTER TABLE show_archive ADD CONSTRAINT show_archive_range CHECK (start_time < %(upper)s)',
+                       {'upper': upper})
+    connection.execute('ALTER TABLE show ATTACH PARTITION show_archive FOR VALUES FROM (MINVALUE) TO (%(upper)s)',
+                       {'upper': upper})
+    connection.execute('ALTER TABLE show_archive DROP CONSTRAINT show_archive_range')
+    connection.execute('ANALYZE show_archive')
+    db.session.commit()
+    return [partition.name for partition in months]
+
+
+def _require_partitions():
+    if not is_partitioned(db.session.connection()):
+        raise click.UsageError('show is not partitioned; set SHOW_PARTITIONING and run `flask db upgrade` '
+                               '(Postgres only).')
+
+
+def init_app(app):
+
+    @app.cli.command('show-partitions')
+    def show_partitions():
+        """List the partitions of show."""
+        _require_partitions()
+        for p in partitions(db.session.connection()):
+            click.echo('{:<16} {:>10} {:>10} {:>10} rows {:>8.1f} MB'.format(
+                p.name, '{:%Y-%m-%d}'.format(p.lower) if p.lower else '-',
+                '{:%Y-%m-%d}'.format(p.upper) if p.upper else '-', p.rows, p.bytes / 1048576.0))
+
+    @app.cli.command('create-show-partitions')
+    @click.option('--months-ahead', type=int, help='Default: SHOW_PARTITION_MONTHS_AHEAD.')
+    def create_show_partitions(months_ahead):
+        """Create the monthly show partitions of the coming months."""
+        _require_partitions()
+        if months_ahead is None:
+            months_ahead = current_app.config.get('SHOW_PARTITION_MONTHS_AHEAD', 12)
+        created = create(months_ahead)
+        click.echo('created {}'.format(', '.join(created)) if created else 'nothing to create')
+
+    @app.cli.command('archive-shows')
+    @click.option('--keep-months', type=int, help='Months before the current one to leave unarchived '
+                                                   '(default: SHOW_ARCHIVE_AFTER_MONTHS).')
+    def archive_shows(keep_months):
+        """Merge old monthly show partitions into show_archive."""
+        _require_partitions()
+        if keep_months is None:
+            keep_months = current_app.config.get('SHOW_ARCHIVE_AFTER_MONTHS', 12)
+        merged = archive(_month(datetime.now(), -keep_months),
+                         tablespace=current_app.config.get('SHOW_ARCHIVE_TABLESPACE'))
+        click.echo('archived {}'.format(', '.join(merged)) if merged else 'nothing to archive')
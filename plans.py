@@ -0,0 +1,120 @@
+# ----------------------------------------------------------------------------#
+# Query plan checks.
+# ----------------------------------------------------------------------------#
+# `flask check-query-plans` runs EXPLAIN on the queries behind each view and
+# exits non-zero if any of them reads the whole show table: a sequential
+# scan, or an index scan without an index condition. Sequential scans are
+# disabled for the check, so the planner only falls back to one when no
+# index can answer the query; the result therefore does not depend on how
+# much data the database holds.
+import json
+from datetime import datetime, timedelta
+
+import click
+
+from bookings import free
+from models import db, Venue, Artist
+from queries import (venue_directory_query, venue_detail_query, artist_detail_query,
+                     show_listing_query)
+from search import search_query
+
+CHECKED_TABLES = ('show',)
+
+# The unfiltered listing legitimately walks ix_show_start_time_id in order
+# and stops at its LIMIT.
+FULL_SCAN_ALLOWED = ('shows',)
+
+
+def view_queries(now=None):
+    now = now or datetime.now()
+    return [
+        ('venues_available', db.session.query(Venue.id).filter(
+            Venue.city == 'New York', free(now, now + timedelta(hours=3)))),
+        ('venues', venue_directory_query()),
+        ('venues?page', venue_directory_query(page=1)),
+        ('show_venue', venue_detail_query(1)),
+        ('show_artist', artist_detail_query(1)),
+        ('shows', show_listing_query().limit(31)),
+        ('shows?upcoming', show_listing_query(upcoming=True, now=now).limit(31)),
+        ('shows?after', show_listing_query(after=(now, 1)).limit(31)),
+        ('shows?from&to', show_listing_query(start=now, end=now).limit(31)),
+        ('search_venues', search_query(Venue, 'hop')),
+        ('search_artists', search_query(Artist, 'band')),
+    ]
+
+
+def _postgres_tables(conn):
+    # A partitioned show is scanned through its partitions (see partitions.py).
+    # Empty ones, such as an unused default partition, cost nothing however
+    # they are read, and with sequential scans off they are read any way.
+    return set(CHECKED_TABLES) | {name for name, in conn.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = ANY(%(tables)s::regclass[]) AND c.relpages > 0", tables=list(CHECKED_TABLES))}
+
+
+def _postgres_scans(conn, statement, params):
+    tables = _postgres_tables(conn)
+    plan = conn.execute('EXPLAIN (FORMAT JSON) ' + statement, params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    def walk(node):
+        if node.get('Relation Name') in tables:
+            if node['Node Type'] == 'Seq Scan':
+                yield 'Seq Scan on {}'.format(node['Relation Name'])
+            elif node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node:
+                yield 'full {} using {} on {}'.format(node['Node Type'], node['Index Name'],
+                                                      node['Relation Name'])
+        for child in node.get('Plans', []):
+            for scan in walk(child):
+                yield scan
+
+    return list(walk(plan[0]['Plan']))
+
+
+def _sqlite_scans(conn, statement, params):
+    scans = []
+    for row in conn.execute('EXPLAIN QUERY PLAN ' + statement, params):
+        detail = row[-1]
+        words = detail.split()
+        # "SCAN show [USING INDEX ...]" reads the whole table or index, and an
+        # AUTOMATIC index is built from a full scan for this query only.
+        if len(words) > 1 and words[1] in CHECKED_TABLES:
+            if words[0] == 'SCAN' or 'AUTOMATIC' in detail:
+                scans.append(detail)
+    return scans
+
+
+def check_plans():
+    engine = db.engine
+    scans_for = _sqlite_scans if engine.dialect.name == 'sqlite' else _postgres_scans
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            if engine.dialect.name == 'postgresql':
+                conn.execute('SET LOCAL enable_seqscan = off')
+            for name, query in view_queries():
+                compiled = query.statement.compile(dialect=engine.dialect)
+                params = compiled.construct_params()
+                if engine.dialect.positional:
+                    params = tuple(params[key] for key in compiled.positiontup)
+                scans = scans_for(conn, str(compiled), params)
+                yield name, scans if name not in FULL_SCAN_ALLOWED else []
+        finally:
+            trans.rollback()
+
+
+def init_app(app):
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if a view's query falls back to a sequential scan on show."""
+        failed = False
+        for name, scans in check_plans():
+            if scans:
+                failed = True
+                click.echo('FAIL {}: {}'.format(name, '; '.join(scans)))
+            else:
+                click.echo('ok   {}'.format(name))
+        if failed:
+            raise SystemExit(1)
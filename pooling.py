@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------------#
+# Connection pool and statement timeouts.
+# ----------------------------------------------------------------------------#
+# The engine's pool is configured from SQLALCHEMY_ENGINE_OPTIONS (see
+# config.py) and uses TimedQueuePool, which records how long each checkout
+# waited and how many timed out. Pool usage and saturation are computed when
+# /metrics is scraped.
+#
+# On Postgres every transaction begun by the session inside a request gets
+# `SET LOCAL statement_timeout`: STATEMENT_TIMEOUT_READ for GET/HEAD
+# requests and STATEMENT_TIMEOUT_WRITE otherwise, so one slow query cannot
+# hold a worker and its connection indefinitely. CLI commands are not
+# limited.
+import time
+import weakref
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+import metrics
+
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'poolclass')
+
+_pools = weakref.WeakSet()
+
+checkout_wait = metrics.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.')
+checkout_timeouts = metrics.counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that gave up after pool_timeout.')
+
+
+class TimedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        _pools.add(self)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        except TimeoutError:
+            checkout_timeouts.inc()
+            raise
+        finally:
+            checkout_wait.observe(time.perf_counter() - started)
+
+
+def _in_use():
+    return sum(pool.checkedout() for pool in list(_pools))
+
+
+def _capacity():
+    return sum(pool.size() + max(pool._max_overflow, 0) for pool in list(_pools))
+
+
+metrics.gauge('db_pool_connections_in_use', 'Connections currently checked out.', _in_use)
+metrics.gauge('db_pool_capacity', 'pool_size plus max_overflow.', _capacity)
+metrics.gauge('db_pool_saturation', 'Share of the pool capacity checked out.',
+              lambda: _in_use() / _capacity() if _capacity() else 0)
+
+
+def _set_statement_timeout(session, transaction, connection):
+    if connection.dialect.name != 'postgresql' or not has_request_context():
+        return
+    setting = 'STATEMENT_TIMEOUT_READ' if request.method in ('GET', 'HEAD') else 'STATEMENT_TIMEOUT_WRITE'
+    timeout = current_app.config.get(setting)
+    if timeout:
+        connection.execute('SET LOCAL statement_timeout = {:d}'.format(timeout))
+
+
+def init_app(app):
+    # Must run before the engine is first used.
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Flask-SQLAlchemy picks the right pool for SQLite itself.
+        for option in POOL_OPTIONS:
+            options.pop(option, None)
+    else:
+        options.setdefault('poolclass', TimedQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    if not event.contains(Session, 'after_begin', _set_statement_timeout):
+        event.listen(Session, 'after_begin', _set_statement_timeout)
@@ -0,0 +1,234 @@
+# ----------------------------------------------------------------------------#
+# Read queries shared by the views.
+# ----------------------------------------------------------------------------#
+import base64
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import and_, func, tuple_
+from sqlalchemy.orm import contains_eager
+
+from models import db, Show, Venue, Artist
+
+
+def venue_directory_query(page=None, per_page=20):
+    # Every venue with its number of upcoming shows, read from the counter.
+    query = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.num_upcoming_shows
+    ).order_by(
+        Venue.state, Venue.city, Venue.name, Venue.id
+    )
+
+    if page is not None:
+        # Paginate by area (city, state) rather than by venue, so an area is
+        # never split across pages. The area window is a subquery of the
+        # same statement, keeping the page to a single round trip.
+        areas = db.session.query(
+            Venue.state, Venue.city
+        ).distinct().order_by(
+            Venue.state, Venue.city
+        ).limit(per_page).offset((page - 1) * per_page).subquery()
+        query = query.join(
+            areas, and_(Venue.state == areas.c.state, Venue.city == areas.c.city)
+        )
+
+    return query
+
+
+def venue_directory(page=None, per_page=20):
+    rows = venue_directory_query(page=page, per_page=per_page)
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({'city': city,
+                      'state': state,
+                      'venues': [{'id': venue.id,
+                                  'name': venue.name,
+                                  'num_upcoming_shows': venue.num_upcoming_shows}
+                                 for venue in venues]})
+    return areas
+
+
+def _detail_query(entity, counterpart, entity_fk, counterpart_fk, entity_id):
+    # The entity, its shows and the counterpart name/image in one statement:
+    # one row per show, or a single row with NULL show columns when the
+    # entity has no shows at all.
+    return db.session.query(
+        entity,
+        Show.start_time,
+        counterpart.id,
+        counterpart.name,
+        counterpart.image_link
+    ).outerjoin(
+        Show, entity_fk == entity.id
+    ).outerjoin(
+        counterpart, counterpart.id == counterpart_fk
+    ).filter(
+        entity.id == entity_id
+    ).order_by(
+        Show.start_time
+    )
+
+
+def venue_detail_query(venue_id):
+    return _detail_query(Venue, Artist, Show.venue_id, Show.artist_id, venue_id)
+
+
+def artist_detail_query(artist_id):
+    return _detail_query(Artist, Venue, Show.artist_id, Show.venue_id, artist_id)
+
+
+def _page_validators(entity, show_fk, entity_id, now):
+    # What a detail page depends on: its row's updated_at (bumped whenever
+    # one of its shows or their counterparts change), and the start time of
+    # its latest show that has already started, which moves when a show goes
+    # from upcoming to past. Both come from index lookups.
+    last_started = db.session.query(
+        func.max(Show.start_time)
+    ).filter(
+        show_fk == entity.id, Show.start_time <= (now or datetime.now())
+    ).as_scalar()
+    return db.session.query(
+        entity.updated_at, last_started.label('last_started')
+    ).filter(
+        entity.id == entity_id
+    ).first()
+
+
+def venue_validators(venue_id, now=None):
+    return _page_validators(Venue, Show.venue_id, venue_id, now)
+
+
+def artist_validators(artist_id, now=None):
+    return _page_validators(Artist, Show.artist_id, artist_id, now)
+
+
+def _partition_shows(rows, prefix, now):
+    past_shows = []
+    upcoming_shows = []
+    for _, start_time, counterpart_id, name, image_link in rows:
+        if start_time is None:
+            continue
+        show = {prefix + '_id': counterpart_id,
+                prefix + '_name': name,
+                prefix + '_image_link': image_link,
+                'start_time': start_time}
+        if start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return past_shows, upcoming_shows
+
+
+def venue_detail(venue_id, now=None):
+    rows = venue_detail_query(venue_id).all()
+    if not rows:
+        return None
+
+    venue = rows[0][0]
+    past_shows, upcoming_shows = _partition_shows(rows, 'artist', now or datetime.now())
+    return {'id': venue.id,
+            'name': venue.name,
+            'city': venue.city,
+            'state': venue.state,
+            'address': venue.address,
+            'phone': venue.phone,
+            'genres': venue.genres,
+            'image_link': venue.image_link,
+            'facebook_link': venue.facebook_link,
+            'website': venue.website,
+            'seeking_talent': venue.seeking_talent,
+            'seeking_description': venue.seeking_description,
+            'past_shows': past_shows,
+            'upcoming_shows': upcoming_shows,
+            'past_shows_count': len(past_shows),
+            'upcoming_shows_count': len(upcoming_shows)}
+
+
+def artist_detail(artist_id, now=None):
+    rows = artist_detail_query(artist_id).all()
+    if not rows:
+        return None
+
+    artist = rows[0][0]
+    past_shows, upcoming_shows = _partition_shows(rows, 'venue', now or datetime.now())
+    return {'id': artist.id,
+            'name': artist.name,
+            'city': artist.city,
+            'state': artist.state,
+            'phone': artist.phone,
+            'genres': artist.genres,
+            'image_link': artist.image_link,
+            'facebook_link': artist.facebook_link,
+            'website': artist.website,
+            'seeking_venue': artist.seeking_venue,
+            'seeking_description': artist.seeking_description,
+            'past_shows': past_shows,
+            'upcoming_shows': upcoming_shows,
+            'past_shows_count': len(past_shows),
+            'upcoming_shows_count': len(upcoming_shows)}
+
+
+def encode_cursor(start_time, show_id):
+    value = '{}|{}'.format(start_time.isoformat(), show_id)
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # Raises ValueError for anything that was not produced by encode_cursor.
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start_time, show_id = value.split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (TypeError, UnicodeError, base64.binascii.Error) as e:
+        raise ValueError('invalid cursor: {}'.format(e))
+
+
+def show_listing_query(after=None, upcoming=False, start=None, end=None, now=None):
+    # Shows ordered by (start_time, id) with venue and artist loaded by the
+    # same statement. Keyset pagination continues after the (start_time, id)
+    # pair in `after`, which the ix_show_start_time_id index answers directly
+    # however deep the page is.
+    query = Show.query.join(Show.venue).join(Show.artist).options(
+        contains_eager(Show.venue), contains_eager(Show.artist)
+    )
+    if upcoming:
+        query = query.filter(Show.start_time > (now or datetime.now()))
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if after is not None:
+        # The plain start_time bound is implied by the row comparison but
+        # lets a partitioned show skip the months before the cursor.
+        query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(*after),
+                             Show.start_time >= after[0])
+    return query.order_by(Show.start_time, Show.id)
+
+
+class ShowPage(object):
+    # Lazily iterates one page of the shows listing so the template can be
+    # streamed while rows are consumed. next_cursor is only known once the
+    # page has been fully iterated.
+
+    def __init__(self, query, limit):
+        self.query = query
+        self.limit = limit
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, show in enumerate(self.query.limit(self.limit + 1)):
+            if count == self.limit:
+                self.next_cursor = encode_cursor(last.start_time, last.id)
+                break
+            last = show
+            yield {'venue_id': show.venue_id,
+                   'venue_name': show.venue.name,
+                   'artist_id': show.artist_id,
+                   'artist_name': show.artist.name,
+                   'artist_image_link': show.artist.image_link,
+                   'start_time': show.start_time}
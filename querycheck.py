@@ -0,0 +1,102 @@
+# ----------------------------------------------------------------------------#
+# N+1 query detection.
+# ----------------------------------------------------------------------------#
+# With NPLUSONE_MODE set ('warn' or 'raise'), every statement a request
+# issues is reduced to its shape (literals, parameters and IN lists
+# replaced by ?), and a shape repeated more than NPLUSONE_THRESHOLD times
+# in one request is reported with the view that issued it and the
+# relationship whose lazy load matches the statement. 'raise' fails the
+# request at the offending statement, so the traceback points at the loop
+# responsible; use it in tests and CI. 'warn' logs it once per request.
+import re
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+
+from models import db
+
+_literals = [
+    (re.compile(r'"'), ''),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+_target = re.compile(r'\bFROM (\w+)')
+_param_columns = re.compile(r'(\w+)\.(\w+) = \?|\? = (\w+)\.(\w+)')
+
+_relationships = None
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def normalize(statement):
+    for pattern, replacement in _literals:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def _relationship_index():
+    # (selected table, table, column) -> relationship names. A lazy load of
+    # a relationship selects from its target table, filtered by the remote
+    # side of the pairs whose local side is the parent's table.
+    global _relationships
+    if _relationships is None:
+        index = {}
+        for model in db.Model.__subclasses__():
+            mapper = inspect(model)
+            for rel in mapper.relationships:
+                for local, remote in rel.local_remote_pairs:
+                    if local.table is mapper.local_table:
+                        key = (rel.mapper.local_table.name, remote.table.name, remote.name)
+                        index.setdefault(key, []).append('{}.{}'.format(model.__name__, rel.key))
+        _relationships = index
+    return _relationships
+
+
+def relationships_for(shape):
+    target = _target.search(shape)
+    if target is None:
+        return []
+    index = _relationship_index()
+    names = []
+    for match in _param_columns.finditer(shape):
+        table, column = match.group(1, 2) if match.group(1) else match.group(3, 4)
+        names.extend(name for name in index.get((target.group(1), table, column), ())
+                     if name not in names)
+    return names
+
+
+def _report(shape, count):
+    relationships = relationships_for(shape)
+    message = '{} repeated the same query {} times{}: {}'.format(
+        request.endpoint or request.path, count,
+        ' (lazy load of {})'.format(' or '.join(relationships)) if relationships else '',
+        shape)
+    if current_app.config.get('NPLUSONE_MODE') == 'raise':
+        raise NPlusOneError(message)
+    current_app.logger.warning(message)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if executemany or not has_request_context() or not current_app.config.get('NPLUSONE_MODE'):
+        return
+    shapes = g.get('query_shapes')
+    if shapes is None:
+        shapes = g.query_shapes = Counter()
+    shape = normalize(statement)
+    shapes[shape] += 1
+    # Reported once, when the shape first crosses the threshold.
+    if shapes[shape] == current_app.config.get('NPLUSONE_THRESHOLD', 5) + 1:
+        _report(shape, shapes[shape])
+
+
+def init_app(app):
+    if not event.contains(Engine, 'after_cursor_execute', _after_cursor_execute):
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,60 @@
+# ----------------------------------------------------------------------------#
+# Read replica routing.
+# ----------------------------------------------------------------------------#
+# With a 'replica' entry in SQLALCHEMY_BINDS, the session sends the reads of
+# GET/HEAD requests (and of views marked @read_only) to the replica; writes,
+# flushes and anything outside a request use the primary. Once a session has
+# written, it stays on the primary, and so does the client for the next
+# REPLICA_STICKY_SECONDS (tracked in its session cookie), so users see
+# their own writes even if the replica lags behind.
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session as client_session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+
+REPLICA = 'replica'
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._use_replica():
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def _use_replica(self):
+        if self._flushing or self.info.get('wrote') or not has_request_context():
+            return False
+        if REPLICA not in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+            return False
+        if request.method not in ('GET', 'HEAD') and not g.get('read_only'):
+            return False
+        return client_session.get('primary_until', 0) <= time.time()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_only(view):
+    # Lets a non-GET view that only reads (e.g. a search form POST) use the
+    # replica.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info['wrote'] = True
+    if has_request_context():
+        sticky = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+        client_session['primary_until'] = time.time() + sticky
+
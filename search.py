@@ -0,0 +1,150 @@
+# ----------------------------------------------------------------------------#
+# Venue and artist search.
+# ----------------------------------------------------------------------------#
+# On Postgres, names and cities are matched with pg_trgm: ILIKE '%term%' and
+# the fuzzy `%` operator are both answered by the GIN trigram indexes created
+# in migration 5d0e7c41b8aa, and hits are ranked by trigram similarity.
+# Genres are matched against the known genre list so the GIN index on the
+# genres array can be used.
+#
+# SQLite (local runs) has no pg_trgm, so an FTS5 table per entity using the
+# trigram tokenizer is kept in sync by triggers and ranked with bm25. Terms
+# shorter than a trigram fall back to LIKE over the same table.
+#
+# Both paths read the number of upcoming shows of every hit from its
+# counter column.
+import threading
+
+from flask import current_app
+from sqlalchemy import func, or_, text
+from sqlalchemy.dialects.postgresql import array
+
+from genres import matching_genres
+from models import db, Venue, Artist
+
+_fts_lock = threading.Lock()
+_fts_ready = set()
+
+
+def search_query(entity, term, limit=None):
+    limit = limit or current_app.config.get('SEARCH_RESULT_LIMIT', 50)
+    if db.engine.dialect.name == 'sqlite':
+        return _search_fts(entity, term, limit)
+    return _search_trigram(entity, term, limit)
+
+
+def search(entity, term, limit=None):
+    term = term.strip()
+    if not term:
+        return []
+    return [{'id': row.id, 'name': row.name, 'num_upcoming_shows': row.num_upcoming_shows}
+            for row in search_query(entity, term, limit=limit)]
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_trigram(entity, term, limit):
+    pattern = '%{}%'.format(_escape_like(term))
+    # pg_trgm's similarity operator is `%`; it is doubled because psycopg2
+    # uses pyformat parameters and custom operators are not escaped.
+    conditions = [entity.name.ilike(pattern, escape='\\'),
+                  entity.name.op('%%')(term),
+                  entity.city.ilike(pattern, escape='\\')]
+    rank = func.greatest(func.similarity(entity.name, term),
+                         func.similarity(entity.city, term) * 0.5)
+
+    genres = matching_genres(term)
+    if genres:
+        genre_match = entity.genres.op('&&')(array(genres))
+        conditions.append(genre_match)
+        rank = rank + func.coalesce(genre_match.cast(db.Integer), 0) * 0.25
+
+    return db.session.query(
+        entity.id,
+        entity.name,
+        entity.num_upcoming_shows
+    ).filter(
+        or_(*conditions)
+    ).order_by(
+        rank.desc(), entity.name
+    ).limit(limit)
+
+
+def _fts_table(entity):
+    return '{}_search'.format(entity.__tablename__)
+
+
+def ensure_fts(engine):
+    # Creates the FTS5 table and its sync triggers once per database. The
+    # table uses the entity table as external content, so it only stores the
+    # index itself.
+    if engine.url in _fts_ready:
+        return
+    with _fts_lock:
+        if engine.url in _fts_ready:
+            return
+        with engine.begin() as conn:
+            for entity in (Venue, Artist):
+                table, fts = entity.__tablename__, _fts_table(entity)
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    name=fts
+                ).scalar()
+                if exists:
+                    continue
+                conn.execute(
+                    "CREATE VIRTUAL TABLE {fts} USING fts5("
+                    "name, city, genres, content='{table}', content_rowid='id', tokenize='trigram')"
+                    .format(fts=fts, table=table))
+                conn.execute(
+                    "CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                    "INSERT INTO {fts}(rowid, name, city, genres) "
+                    "VALUES (new.id, new.name, new.city, new.genres); END"
+                    .format(fts=fts, table=table))
+                conn.execute(
+                    "CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                    "INSERT INTO {fts}({fts}, rowid, name, city, genres) "
+                    "VALUES ('delete', old.id, old.name, old.city, old.genres); END"
+                    .format(fts=fts, table=table))
+                conn.execute(
+                    "CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+                    "INSERT INTO {fts}({fts}, rowid, name, city, genres) "
+                    "VALUES ('delete', old.id, old.name, old.city, old.genres); "
+                    "INSERT INTO {fts}(rowid, name, city, genres) "
+                    "VALUES (new.id, new.name, new.city, new.genres); END"
+                    .format(fts=fts, table=table))
+                conn.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=fts))
+        _fts_ready.add(engine.url)
+
+
+def _search_fts(entity, term, limit):
+    # The FTS table must exist wherever the search runs, replica included.
+    ensure_fts(db.session.get_bind())
+    fts = _fts_table(entity)
+    if len(term) >= 3:
+        # The whole term is matched as a case-insensitive substring.
+        hits = text(
+            'SELECT rowid AS id, rank FROM {fts} WHERE {fts} MATCH :query ORDER BY rank LIMIT :limit'
+            .format(fts=fts)
+        ).bindparams(query='"{}"'.format(term.replace('"', '""')), limit=limit)
+    else:
+        hits = text(
+            "SELECT rowid AS id, 0.0 AS rank FROM {fts} "
+            "WHERE name LIKE :pattern ESCAPE '\\' OR city LIKE :pattern ESCAPE '\\' "
+            "LIMIT :limit".format(fts=fts)
+        ).bindparams(pattern='%{}%'.format(_escape_like(term)), limit=limit)
+    hits = hits.columns(id=db.Integer, rank=db.Float).alias('hits')
+
+    return db.session.query(
+        entity.id,
+        entity.name,
+        entity.num_upcoming_shows
+    ).select_from(
+        hits
+    ).join(
+        entity, entity.id == hits.c.id
+    ).order_by(
+        hits.c.rank, entity.name
+    )
@@ -0,0 +1,207 @@
+# ----------------------------------------------------------------------------#
+# Synthetic data.
+# ----------------------------------------------------------------------------#
+# `flask seed-data --shows 100000` generates a catalog of venues, artists and
+# shows and loads it through the bulk importer. The same --seed and --anchor
+# always produce the same rows. The data is skewed the way the real catalog
+# is: a few cities and genres account for most venues and artists, a few
+# popular venues and artists host most shows, and artists mostly play in
+# their own city. Shows are spread over a year either side of the anchor
+# date, so about half are upcoming.
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import click
+
+import bulk
+import cache
+import counters
+from genres import GENRES
+from models import db, Show, Venue, Artist
+
+SCALES = {'small': 10000, 'medium': 100000, 'large': 1000000}
+
+# Hours at which a venue's shows may start.
+SLOTS = (17, 20, 23)
+
+# (city, state, relative size)
+CITIES = (
+    ('New York', 'NY', 30), ('Los Angeles', 'CA', 22), ('Chicago', 'IL', 14), ('Houston', 'TX', 10),
+    ('San Francisco', 'CA', 9), ('Austin', 'TX', 9), ('Nashville', 'TN', 8), ('Seattle', 'WA', 7),
+    ('Atlanta', 'GA', 6), ('New Orleans', 'LA', 6), ('Philadelphia', 'PA', 5), ('Boston', 'MA', 5),
+    ('Denver', 'CO', 4), ('Portland', 'OR', 4), ('Detroit', 'MI', 3), ('Minneapolis', 'MN', 3),
+    ('Miami', 'FL', 3), ('Memphis', 'TN', 2), ('Kansas City', 'MO', 2), ('Baltimore', 'MD', 2),
+    ('Salt Lake City', 'UT', 1), ('Albuquerque', 'NM', 1), ('Boise', 'ID', 1), ('Tulsa', 'OK', 1),
+)
+
+# Venues are scattered around their city's center.
+CITY_CENTERS = {
+    'New York': (40.7128, -74.0060), 'Los Angeles': (34.0522, -118.2437), 'Chicago': (41.8781, -87.6298),
+    'Houston': (29.7604, -95.3698), 'San Francisco': (37.7749, -122.4194), 'Austin': (30.2672, -97.7431),
+    'Nashville': (36.1627, -86.7816), 'Seattle': (47.6062, -122.3321), 'Atlanta': (33.7490, -84.3880),
+    'New Orleans': (29.9511, -90.0715), 'Philadelphia': (39.9526, -75.1652), 'Boston': (42.3601, -71.0589),
+    'Denver': (39.7392, -104.9903), 'Portland': (45.5152, -122.6784), 'Detroit': (42.3314, -83.0458),
+    'Minneapolis': (44.9778, -93.2650), 'Miami': (25.7617, -80.1918), 'Memphis': (35.1495, -90.0490),
+    'Kansas City': (39.0997, -94.5786), 'Baltimore': (39.2904, -76.6122), 'Salt Lake City': (40.7608, -111.8910),
+    'Albuquerque': (35.0844, -106.6504), 'Boise': (43.6150, -116.2023), 'Tulsa': (36.1540, -95.9928),
+}
+
+VENUE_WORDS = ('Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Old', 'Dueling', 'Midnight', 'Silver',
+               'Lucky', 'Rusty', 'Crooked', 'Little', 'Grand', 'Hidden', 'Iron')
+VENUE_NOUNS = ('Room', 'Hall', 'Lounge', 'Tavern', 'Theater', 'Club', 'Barn', 'Garden', 'Cellar',
+               'Warehouse', 'Pianos Bar', 'Coffee House', 'Ballroom', 'Pavilion')
+ARTIST_WORDS = ('Wild', 'Quiet', 'Neon', 'Broken', 'Velvet', 'Howling', 'Lonesome', 'Cosmic',
+                'Gentle', 'Savage', 'Paper', 'Glass', 'Northern', 'Southern', 'Electric', 'Burning')
+ARTIST_NOUNS = ('Petals', 'Wolves', 'Sax Band', 'Strangers', 'Rivers', 'Echoes', 'Pilots',
+                'Saints', 'Horses', 'Lanterns', 'Ghosts', 'Brothers', 'Sisters', 'Machines', 'Trio')
+
+
+def _zipf_weights(count, s=1.1):
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, count + 1)))
+
+
+class Generator(object):
+
+    def __init__(self, shows, venues=None, artists=None, seed=0, anchor=None):
+        self.num_shows = shows
+        self.num_venues = venues or max(1, shows // 20)
+        self.num_artists = artists or max(1, shows // 10)
+        self.seed = seed
+        self.anchor = anchor or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.city_weights = list(itertools.accumulate(size for _, _, size in CITIES))
+        self.genre_weights = _zipf_weights(len(GENRES))
+
+    def _rng(self, kind):
+        # One stream per kind, so changing --shows does not reshuffle venues.
+        return random.Random('{}:{}'.format(self.seed, kind))
+
+    def _genres(self, rng):
+        count = rng.choice((1, 1, 2, 2, 3))
+        return sorted(set(rng.choices(GENRES, cum_weights=self.genre_weights, k=count)))
+
+    def _phone(self, rng):
+        return '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(200, 999),
+                                             rng.randint(0, 9999))
+
+    def _city(self, id, kind):
+        # Entity ids map to cities deterministically, so show generation can
+        # find an artist's city without the generated artists.
+        rng = random.Random('{}:{}-city:{}'.format(self.seed, kind, id))
+        return rng.choices(range(len(CITIES)), cum_weights=self.city_weights)[0]
+
+    def venues(self):
+        rng = self._rng('venues')
+        # A stream of its own, so locations leave the other columns as they were.
+        location_rng = self._rng('venue-locations')
+        for id in range(1, self.num_venues + 1):
+            city, state, _ = CITIES[self._city(id, 'venue')]
+            latitude, longitude = CITY_CENTERS[city]
+            seeking = rng.random() < 0.3
+            yield {'id': id,
+                   'name': '{} {} {}'.format(rng.choice(VENUE_WORDS), rng.choice(VENUE_NOUNS), id),
+                   'city': city,
+                   'state': state,
+                   'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(VENUE_WORDS)),
+                   'phone': self._phone(rng),
+                   'genres': self._genres(rng),
+                   'image_link': 'https://picsum.photos/seed/venue{}/400/300'.format(id),
+                   'facebook_link': 'https://www.facebook.com/venue{}'.format(id),
+                   'website': 'https://venue{}.example.com'.format(id),
+                   'seeking_talent': seeking,
+                   'seeking_description': 'Looking for local acts.' if seeking else None,
+                   'latitude': round(latitude + location_rng.gauss(0, 0.08), 6),
+                   'longitude': round(longitude + location_rng.gauss(0, 0.1), 6)}
+
+    def artists(self):
+        rng = self._rng('artists')
+        for id in range(1, self.num_artists + 1):
+            city, state, _ = CITIES[self._city(id, 'artist')]
+            seeking = rng.random() < 0.4
+            yield {'id': id,
+                   'name': 'The {} {} {}'.format(rng.choice(ARTIST_WORDS), rng.choice(ARTIST_NOUNS), id),
+                   'city': city,
+                   'state': state,
+                   'phone': self._phone(rng),
+                   'genres': self._genres(rng),
+                   'image_link': 'https://picsum.photos/seed/artist{}/400/400'.format(id),
+                   'facebook_link': 'https://www.facebook.com/artist{}'.format(id),
+                   'website': 'https://artist{}.example.com'.format(id),
+                   'seeking_venue': seeking,
+                   'seeking_description': 'Looking for shows.' if seeking else None}
+
+    def shows(self):
+        rng = self._rng('shows')
+        venues_by_city = {}
+        for id in range(1, self.num_venues + 1):
+            venues_by_city.setdefault(self._city(id, 'venue'), []).append(id)
+        city_venue_weights = {city: _zipf_weights(len(ids), 0.8) for city, ids in venues_by_city.items()}
+        all_venues = list(range(1, self.num_venues + 1))
+        venue_weights = _zipf_weights(self.num_venues, 0.8)
+        artist_weights = _zipf_weights(self.num_artists, 0.8)
+        artists = range(1, self.num_artists + 1)
+        artist_cities = [None] + [self._city(id, 'artist') for id in artists]
+
+        # Each venue has three three-hour slots a day, so no two shows of a
+        # venue overlap; a venue whose slot is taken is drawn again.
+        booked = set()
+        for id in range(1, self.num_shows + 1):
+            artist_id = rng.choices(artists, cum_weights=artist_weights)[0]
+            city = artist_cities[artist_id]
+            while True:
+                if city in venues_by_city and rng.random() < 0.7:
+                    venue_id = rng.choices(venues_by_city[city], cum_weights=city_venue_weights[city])[0]
+                else:
+                    venue_id = rng.choices(all_venues, cum_weights=venue_weights)[0]
+                slot = (venue_id, rng.randint(-365, 365), rng.choice(SLOTS))
+                if slot not in booked:
+                    break
+            booked.add(slot)
+            start_time = self.anchor + timedelta(days=slot[1], hours=slot[2], minutes=rng.choice((0, 30)))
+            end_time = start_time + timedelta(minutes=rng.choice((90, 120, 150)))
+            yield {'id': id, 'artist_id': artist_id, 'venue_id': venue_id,
+                   'start_time': start_time.isoformat(), 'end_time': end_time.isoformat()}
+
+
+def reset():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute('TRUNCATE show, venue, artist RESTART IDENTITY')
+    else:
+        for model in (Show, Venue, Artist):
+            db.session.query(model).delete()
+    db.session.commit()
+
+
+def init_app(app):
+
+    @app.cli.command('seed-data')
+    @click.option('--scale', type=click.Choice(sorted(SCALES)), help='Preset number of shows.')
+    @click.option('--shows', type=int, help='Number of shows (default: the small scale).')
+    @click.option('--venues', type=int, help='Number of venues (default: shows / 20).')
+    @click.option('--artists', type=int, help='Number of artists (default: shows / 10).')
+    @click.option('--seed', default=0, show_default=True)
+    @click.option('--anchor', type=click.DateTime(['%Y-%m-%d']),
+                  help='Date the shows are spread around (default: today).')
+    @click.option('--reset', 'replace', is_flag=True, help='Delete all venues, artists and shows first.')
+    @click.option('--batch-size', default=10000, show_default=True)
+    def seed_data(scale, shows, venues, artists, seed, anchor, replace, batch_size):
+        """Load a deterministic synthetic catalog."""
+        if replace:
+            reset()
+        elif db.session.query(Venue.id).first() or db.session.query(Artist.id).first():
+            raise click.UsageError('The database already has data; pass --reset to replace it.')
+
+        generator = Generator(shows or SCALES[scale or 'small'], venues, artists, seed, anchor)
+        for kind, rows in (('venues', generator.venues()),
+                           ('artists', generator.artists()),
+                           ('shows', generator.shows())):
+            written, rejected = bulk.load(kind, enumerate(rows, 1), batch_size)
+            click.echo('{} {} ({} rejected)'.format(written, kind, rejected))
+
+        # The batches counted upcoming shows as of the last roll; recount
+        # them as of now.
+        counters.repair()
+        # Fresh planner statistics for the new data.
+        db.session.execute('ANALYZE')
+        db.session.commit()
+        cache.clear()
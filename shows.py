@@ -0,0 +1,96 @@
+# ----------------------------------------------------------------------------#
+# Shows.
+# ----------------------------------------------------------------------------#
+# The show listing and the create form. The form is imported inside the view
+# that renders it.
+import sys
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, Response, flash, abort, stream_with_context
+
+import bookings
+from app import stream_template
+from cache import cached
+from models import db, Show
+from queries import show_listing_query, decode_cursor, ShowPage
+
+blueprint = Blueprint('shows', __name__, url_prefix='/shows')
+
+
+@blueprint.route('')
+@cached(['shows'])
+def shows():
+    # displays list of shows at /shows
+    # Keyset-paginated by (start_time, id); ?after=<cursor> continues from the
+    # previous page, ?upcoming=1 hides past shows and ?from=/?to= (YYYY-MM-DD)
+    # restrict the date range. The page is streamed as rows arrive.
+    try:
+        after = decode_cursor(request.args['after']) if request.args.get('after') else None
+        start, end = (datetime.strptime(request.args[arg], '%Y-%m-%d') if request.args.get(arg) else None
+                      for arg in ('from', 'to'))
+    except ValueError:
+        abort(400)
+    limit = max(1, min(request.args.get('limit', 30, type=int), 100))
+
+    query = show_listing_query(after=after,
+                               upcoming=bool(request.args.get('upcoming')),
+                               start=start,
+                               end=end)
+    page = ShowPage(query, limit)
+
+    # The "next" link keeps the active filters.
+    filters = {arg: request.args[arg] for arg in ('upcoming', 'from', 'to') if request.args.get(arg)}
+    filters['limit'] = limit
+    return Response(stream_with_context(stream_template('pages/shows.html', shows=page, filters=filters)))
+
+
+@blueprint.route('/create')
+def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@blueprint.route('/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    # TODO: insert form data as a new Show record in the db, instead
+    # Without an end time the show gets the default duration. A show that
+    # overlaps another at the same venue is refused.
+    error = False
+    booked = False
+    try:
+        show = Show(artist_id=request.form['artist_id'],
+                    venue_id=request.form['venue_id'],
+                    start_time=datetime.fromisoformat(request.form['start_time']),
+                    end_time=datetime.fromisoformat(request.form['end_time']) if request.form.get('end_time') else None)
+
+        db.session.add(show)
+        db.session.commit()
+
+    except bookings.Conflict:
+        booked = True
+        db.session.rollback()
+
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    finally:
+        db.session.close()
+        if booked:
+            flash('The venue is already booked at that time; the show could not be listed.')
+        elif error:
+            flash('Internal Error: Unable to add a show!')
+        else:
+            flash('Show was successfully listed!')
+
+    # on successful db insert, flash success
+    # flash('Show was successfully listed!')
+    # flash('Show was successfully listed!')
+    # TODO: on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Show could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    return render_template('pages/home.html')
@@ -2,3 +2,28 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-typeahead]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var datalist = document.getElementById(input.getAttribute('list'));
+    var pending = null;
+    input.addEventListener('input', function () {
+      if (pending) {
+        pending.abort();
+      }
+      pending = new XMLHttpRequest();
+      pending.open('GET', '/typeahead?type=' + input.dataset.typeahead + '&q=' + encodeURIComponent(input.value));
+      pending.onload = function () {
+        var results = JSON.parse(this.responseText).results;
+        datalist.innerHTML = '';
+        results.forEach(function (result) {
+          var option = document.createElement('option');
+          option.value = result.name;
+          datalist.appendChild(option);
+        });
+      };
+      pending.send();
+    });
+  });
+});
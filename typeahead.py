@@ -0,0 +1,99 @@
+# ----------------------------------------------------------------------------#
+# Typeahead.
+# ----------------------------------------------------------------------------#
+# Venue and artist names are kept in memory as a sorted list of
+# (key, kind, id) tuples, with one key per word of the name, so a lookup is a
+# bisect plus a short scan and never touches the database. The index is
+# loaded when the worker serves its first request, updated by the views that
+# create, edit or delete venues and artists, and reloaded after
+# TYPEAHEAD_REFRESH_SECONDS to pick up writes made by other workers.
+import bisect
+import threading
+import time
+
+from flask import current_app
+
+from models import db, Venue, Artist
+
+
+def _keys(name):
+    words = (name or '').lower().split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex(object):
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._names = {}
+        self.loaded_at = None
+
+    def load(self, entries):
+        # entries: iterable of (kind, id, name)
+        keys = []
+        names = {}
+        for kind, id, name in entries:
+            names[(kind, id)] = name
+            keys.extend((key, kind, id) for key in _keys(name))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._names = names
+            self.loaded_at = time.time()
+
+    def add(self, kind, id, name):
+        with self._lock:
+            self.remove(kind, id)
+            self._names[(kind, id)] = name
+            for key in _keys(name):
+                bisect.insort(self._keys, (key, kind, id))
+
+    def remove(self, kind, id):
+        with self._lock:
+            name = self._names.pop((kind, id), None)
+            if name is None:
+                return
+            for key in _keys(name):
+                i = bisect.bisect_left(self._keys, (key, kind, id))
+                if i < len(self._keys) and self._keys[i] == (key, kind, id):
+                    del self._keys[i]
+
+    def lookup(self, prefix, kind=None, limit=10):
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, entry_kind, id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                i += 1
+                if (kind and entry_kind != kind) or (entry_kind, id) in seen:
+                    continue
+                seen.add((entry_kind, id))
+                results.append({'type': entry_kind, 'id': id, 'name': self._names[(entry_kind, id)]})
+        return results
+
+
+index = PrefixIndex()
+
+
+def load():
+    entries = [('venue', id, name) for id, name in db.session.query(Venue.id, Venue.name)]
+    entries += [('artist', id, name) for id, name in db.session.query(Artist.id, Artist.name)]
+    index.load(entries)
+
+
+def lookup(prefix, kind=None, limit=None):
+    refresh = current_app.config.get('TYPEAHEAD_REFRESH_SECONDS')
+    if index.loaded_at is None or (refresh and time.time() - index.loaded_at > refresh):
+        load()
+    return index.lookup(prefix, kind=kind, limit=limit or current_app.config.get('TYPEAHEAD_LIMIT', 10))
+
+
+def init_app(app):
+    app.before_first_request(load)
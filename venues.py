@@ -0,0 +1,201 @@
+# ----------------------------------------------------------------------------#
+# Venues.
+# ----------------------------------------------------------------------------#
+# Listing, search, detail, create, edit and delete views for venues. Forms
+# are imported inside the views that render them, so workers and CLI jobs
+# only load WTForms when a form is first shown.
+import sys
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for, abort
+
+import geo
+import typeahead
+from app import formaturl
+from cache import cached, conditional
+from models import db, Venue
+from queries import venue_directory, venue_detail, venue_validators
+from routing import read_only
+from search import search
+
+blueprint = Blueprint('venues', __name__, url_prefix='/venues')
+
+
+@blueprint.route('')
+@cached(['venues'])
+def venues():
+    # Venues grouped by area, each with its number of upcoming shows, built
+    # from a single grouped query. Pass ?page=N to paginate by area.
+    page = request.args.get('page', type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    if page is not None and (page < 1 or per_page < 1):
+        abort(404)
+
+    data = venue_directory(page=page, per_page=per_page)
+    return render_template('pages/venues.html', areas=data, page=page, per_page=per_page,
+                           has_next=page is not None and len(data) == per_page)
+
+
+@blueprint.route('/search', methods=['POST'])
+@read_only
+def search_venues():
+    # Case-insensitive, ranked search over venue name, city and genres.
+    # search for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    search_term = request.form['search_term']
+    data = search(Venue, search_term)
+
+    response = {
+        "count": len(data),
+        "data": data
+    }
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+
+@blueprint.route('/<int:venue_id>')
+@conditional(venue_validators)
+@cached(lambda venue_id: ['venue:{}'.format(venue_id)])
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # The venue, its shows and their artists are loaded in one query and
+    # split into past/upcoming in a single pass.
+    data = venue_detail(venue_id)
+    if data is None:
+        abort(404)
+
+    return render_template('pages/show_venue.html', venue=data)
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@blueprint.route('/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@blueprint.route('/create', methods=['POST'])
+def create_venue_submission():
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    error = False
+
+    try:
+        venue = Venue(
+          name=request.form['name'],
+          city=request.form['city'],
+          state=request.form['state'],
+          address=request.form['address'],
+          phone=request.form['phone'],
+          genres=request.form.getlist('genres'),
+          facebook_link=formaturl(request.form.get('facebook_link')),
+          website=formaturl(request.form.get('website')),
+          image_link=formaturl(request.form.get('image_link')),
+          seeking_talent=request.form.get('seeking_talent') == 'y',
+          seeking_description=request.form.get('seeking_description'),
+          latitude=request.form.get('latitude', type=float),
+          longitude=request.form.get('longitude', type=float)
+        )
+        geo.validate(venue.latitude, venue.longitude)
+
+        db.session.add(venue)
+        db.session.commit()
+        typeahead.index.add('venue', venue.id, venue.name)
+
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    finally:
+        db.session.close()
+        if error:
+            flash('Internal server error: Unable to create a new venue ' + request.form['name'] + '!')
+        else:
+            flash('Venue ' + request.form['name'] + ' was successfully listed!')
+
+    # on successful db insert, flash success
+    # TODO: on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    return render_template('pages/home.html')
+
+
+@blueprint.route('/<venue_id>', methods=['POST'])
+def delete_venue(venue_id):
+    # TODO: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    error = False
+    venue = Venue.query.get(venue_id)
+    name = venue.name
+
+    try:
+        db.session.delete(venue)
+        db.session.commit()
+        typeahead.index.remove('venue', venue.id)
+
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    finally:
+        db.session.close()
+        if error:
+             flash('Internal server error: Venue - ' + name + ' could not be deleted.')
+        else:
+             flash('Venue ' + name + ' was deleted successfully!')
+
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+    return render_template('pages/home.html')
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+@blueprint.route('/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    # TODO: populate form with values from venue with ID <venue_id>
+    return redirect(url_for('venues.show_venue', venue_id=Venue.query.get(venue_id)))
+
+
+@blueprint.route('/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+    error = False
+    try:
+        venue = Venue.query.get(venue_id)
+        venue.name = request.form['name']
+        venue.city = request.form['city']
+        venue.state = request.form['state']
+        venue.address = request.form['address']
+        venue.phone = request.form['phone']
+        venue.genres = request.form.getlist('genres')
+        venue.image_link = request.form.get('image_link')
+        venue.facebook_link = request.form.get('facebook_link')
+        venue.website = request.form.get('website')
+        venue.seeking_talent = request.form.get('seeking_talent') == 'y'
+        venue.seeking_description = request.form.get('seeking_description')
+        venue.latitude = request.form.get('latitude', type=float)
+        venue.longitude = request.form.get('longitude', type=float)
+        geo.validate(venue.latitude, venue.longitude)
+        db.session.add(venue)
+        db.session.commit()
+        typeahead.index.add('venue', venue.id, venue.name)
+
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+
+    finally:
+        db.session.close()
+        if error:
+            flash('Internal server error: Failed to save the edited info for venue: ' + request.form['name'] + '!')
+        else:
+            flash('Venue ' + request.form['name'] + ' info was updated successfully!')
+
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))